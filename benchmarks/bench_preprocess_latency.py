@@ -0,0 +1,51 @@
+"""Benchmark latency of preprocessing a single profile.
+
+Compares calling :func:`heavyedge.profile.preprocess` on each profile with calling
+a reusable :class:`heavyedge.profile.Preprocessor`, and prints latency percentiles.
+
+Run::
+
+    python benchmarks/bench_preprocess_latency.py
+"""
+
+import time
+
+import numpy as np
+
+from heavyedge import RawProfileCsvs, get_sample_path
+from heavyedge.profile import Preprocessor, preprocess
+
+
+def latencies(func, Ys, repeat):
+    ret = []
+    for _ in range(repeat):
+        for Y in Ys:
+            start = time.perf_counter()
+            func(Y)
+            ret.append(time.perf_counter() - start)
+    return np.array(ret) * 1e3
+
+
+def main(sigma=32, std_thres=0.01, repeat=20):
+    Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    Ys = Ys[np.all(np.isfinite(Ys), axis=1)]
+    N, M = Ys.shape
+    print(f"{N} profiles x {repeat} repeats, M={M}, sigma={sigma}")
+    print(f"{'':24}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}  (ms)")
+    for filter in ["fir", "iir"]:
+        preprocessor = Preprocessor(M, sigma, std_thres, filter)
+        for label, func in [
+            (
+                f"preprocess ({filter})",
+                lambda Y: preprocess(Y[None], sigma, std_thres, filter),
+            ),
+            (f"Preprocessor ({filter})", preprocessor),
+        ]:
+            func(Ys[0])  # warm up
+            t = latencies(func, Ys, repeat)
+            p50, p90, p99 = np.percentile(t, [50, 90, 99])
+            print(f"{label:24}{p50:8.3f}{p90:8.3f}{p99:8.3f}{t.max():8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark HDF5 layouts of ProfileData.
+
+Writes and reads replicated sample profiles in batches with each chunk and
+compression option, ragged and contiguous layouts, and prints throughput and file
+size. Contiguous profiles are read by h5py and by memory map.
+
+Run::
+
+    python benchmarks/bench_profiledata_layout.py
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from heavyedge import ProfileData, get_sample_path
+
+LAYOUTS = {
+    "h5py auto chunks": dict(chunks=True),
+    "default chunks": dict(),
+    "gzip": dict(compression="gzip"),
+    "gzip + shuffle": dict(compression="gzip", shuffle=True),
+    "lzf": dict(compression="lzf"),
+    "lzf + shuffle": dict(compression="lzf", shuffle=True),
+    "ragged": dict(ragged=True),
+    "ragged + gzip": dict(ragged=True, compression="gzip"),
+    "contiguous": dict(chunks=False),
+}
+
+
+def main(copies=100, batch_size=32):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+    Ys, Ls, names = (
+        np.tile(Ys, (copies, 1)),
+        np.tile(Ls, copies),
+        np.tile(names, copies),
+    )
+    N, M = Ys.shape
+    mb = Ys.nbytes / 2**20
+    print(f"{N} profiles, M={M}, {mb:.1f} MiB, batch size {batch_size}")
+    print(f"{'':20}{'write MiB/s':>12}{'read MiB/s':>12}{'size MiB':>10}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for label, kwargs in LAYOUTS.items():
+            path = Path(tmpdir) / f"{label}.h5"
+            start = time.perf_counter()
+            with ProfileData(path, "w").create(M, res, capacity=N, **kwargs) as out:
+                for i in range(0, N, batch_size):
+                    sl = slice(i, i + batch_size)
+                    out.write_profiles(Ys[sl], Ls[sl], names[sl])
+            t_write = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ProfileData(path) as f:
+                for i in range(0, N, batch_size):
+                    f[i : i + batch_size]
+            t_read = time.perf_counter() - start
+
+            size = path.stat().st_size / 2**20
+            print(f"{label:20}{mb / t_write:12.1f}{mb / t_read:12.1f}{size:10.1f}")
+
+        path = Path(tmpdir) / "contiguous.h5"
+        start = time.perf_counter()
+        with ProfileData(path) as f:
+            mm = f.memmap()
+            for i in range(0, N, batch_size):
+                np.array(mm[i : i + batch_size])
+        t_read = time.perf_counter() - start
+        print(f"{'contiguous memmap':20}{'':12}{mb / t_read:12.1f}{size:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
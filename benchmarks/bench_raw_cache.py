@@ -0,0 +1,47 @@
+"""Benchmark binary cache of raw CSV profiles.
+
+Compares reading all profiles without cache, with cold cache (building) and with
+warm cache (memory-mapped).
+
+Run::
+
+    python benchmarks/bench_raw_cache.py
+"""
+
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from heavyedge import RawProfileCsvs, get_sample_path
+
+
+def read_all(path, cache):
+    start = time.perf_counter()
+    raw = RawProfileCsvs(path, cache=cache)
+    raw[:]
+    return time.perf_counter() - start
+
+
+def main(copies=20):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rawdir = Path(tmpdir) / "raw"
+        rawdir.mkdir()
+        # Replicate sample files to get larger raw data.
+        files = sorted(Path(get_sample_path("Type3")).glob("*.csv"))
+        for i in range(copies):
+            for file in files:
+                shutil.copy(file, rawdir / f"{i:03d}-{file.name}")
+        N = copies * len(files)
+
+        t_none = read_all(rawdir, False)
+        t_cold = read_all(rawdir, True)
+        t_warm = read_all(rawdir, True)
+        print(f"{N} files")
+        print(f"no cache   : {t_none:.3f} s")
+        print(f"cold cache : {t_cold:.3f} s")
+        print(f"warm cache : {t_warm:.3f} s (speedup x{t_none / t_warm:.1f})")
+
+
+if __name__ == "__main__":
+    main()
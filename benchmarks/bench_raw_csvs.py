@@ -0,0 +1,54 @@
+"""Benchmark parsing of raw CSV profiles.
+
+Compares :class:`heavyedge.RawProfileCsvs` against the former reader based on
+:mod:`csv` module.
+
+Run::
+
+    python benchmarks/bench_raw_csvs.py
+"""
+
+import csv
+import timeit
+
+import numpy as np
+
+from heavyedge import RawProfileCsvs, get_sample_path
+
+
+def read_profile_csv(path):
+    with open(path, newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        profile = np.array([float(row[0]) for row in reader])
+    return profile
+
+
+def main(repeat=5):
+    for sample in ["Type1", "Type2", "Type3"]:
+        raw = RawProfileCsvs(get_sample_path(sample))
+        files = [raw.path / name for name in raw._files]
+
+        for file in files:
+            assert np.array_equal(read_profile_csv(file), raw._read_profile(file))
+
+        t_csv = min(
+            timeit.repeat(
+                lambda: [read_profile_csv(f) for f in files], number=1, repeat=repeat
+            )
+        )
+        t_new = min(
+            timeit.repeat(
+                lambda: [raw._read_profile(f) for f in files], number=1, repeat=repeat
+            )
+        )
+        N = len(files)
+        print(
+            f"{sample} ({N} files): "
+            f"csv {t_csv / N * 1e3:.3f} ms/file, "
+            f"numpy {t_new / N * 1e3:.3f} ms/file, "
+            f"speedup x{t_csv / t_new:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 
 __all__ = [
     "prep",
+    "prep_sweep",
     "fill",
     "preprocess",
     "fill_after",
@@ -22,5 +23,5 @@ __all__ = [
 from .edge import pad, scale_area, scale_plateau, trim
 from .landmarks import landmarks_type2, landmarks_type3, plateau_type2, plateau_type3
 from .mean import mean_euclidean, mean_wasserstein
-from .preprocess import fill, prep
+from .preprocess import fill, prep, prep_sweep
 from .profile import fill_after, mean, outlier, preprocess
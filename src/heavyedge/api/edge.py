@@ -12,7 +12,7 @@ __all__ = [
 ]
 
 
-def scale_area(f, batch_size=None, logger=lambda x: None):
+def scale_area(f, batch_size=None, logger=lambda x: None, prefetch=None):
     """Scale edge profile by area.
 
     Parameters
@@ -24,6 +24,9 @@ def scale_area(f, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Yields
     ------
@@ -54,20 +57,21 @@ def scale_area(f, batch_size=None, logger=lambda x: None):
         logger(f"{N}/{N}")
         yield Ys, Ls, names
     else:
-        for i in range(0, N, batch_size):
-            Ys, Ls, names = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch)
+        for i, (Ys, Ls, names) in zip(range(0, N, batch_size), batches):
             Ys /= _area(x, Ys, Ls)[:, np.newaxis]
             logger(f"{i}/{N}")
             yield Ys, Ls, names
 
 
 def _area(x, Ys, Ls):
-    Ys = Ys.copy()
+    # Area is integrated in float64 regardless of the profile data type.
+    Ys = Ys.astype(np.float64)
     fill_after(Ys, Ls, 0)
     return np.trapezoid(Ys, x, axis=1)
 
 
-def scale_plateau(f, batch_size=None, logger=lambda x: None):
+def scale_plateau(f, batch_size=None, logger=lambda x: None, prefetch=None):
     """Scale edge profile by plateau height.
 
     Parameters
@@ -79,6 +83,9 @@ def scale_plateau(f, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Yields
     ------
@@ -107,14 +114,14 @@ def scale_plateau(f, batch_size=None, logger=lambda x: None):
         logger(f"{N}/{N}")
         yield Ys, Ls, names
     else:
-        for i in range(0, N, batch_size):
-            Ys, Ls, names = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch)
+        for i, (Ys, Ls, names) in zip(range(0, N, batch_size), batches):
             Ys /= Ys[:, [0]]
             logger(f"{i}/{N}")
             yield Ys, Ls, names
 
 
-def trim(f, width1, width2, batch_size=None, logger=lambda x: None):
+def trim(f, width1, width2, batch_size=None, logger=lambda x: None, prefetch=None):
     """Trim edge profile to a specific width.
 
     This function matches the contact points of all profiles to a same location.
@@ -131,6 +138,9 @@ def trim(f, width1, width2, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Yields
     ------
@@ -158,12 +168,12 @@ def trim(f, width1, width2, batch_size=None, logger=lambda x: None):
     Ls = f._file["len"][:]
 
     if batch_size is None:
-        Ys, Ls, names = f[:]
+        Ys, Ls, names = f._view(slice(None))
         logger(f"{N}/{N}")
         yield _trim(Ys, Ls, width1, width2), Ls, names
     else:
-        for i in range(0, N, batch_size):
-            Ys, Ls, names = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch, readonly=True)
+        for i, (Ys, Ls, names) in zip(range(0, N, batch_size), batches):
             logger(f"{i}/{N}")
             yield _trim(Ys, Ls, width1, width2), Ls, names
 
@@ -177,7 +187,7 @@ def _trim(Ys, Ls, w1, w2):
     return ret
 
 
-def pad(f, width1, width2, batch_size=None, logger=lambda x: None):
+def pad(f, width1, width2, batch_size=None, logger=lambda x: None, prefetch=None):
     """Pad edge profile to a specific width.
 
     Parameters
@@ -192,6 +202,9 @@ def pad(f, width1, width2, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Yields
     ------
@@ -219,12 +232,12 @@ def pad(f, width1, width2, batch_size=None, logger=lambda x: None):
     Ls = f._file["len"][:]
 
     if batch_size is None:
-        Ys, Ls, names = f[:]
+        Ys, Ls, names = f._view(slice(None))
         logger(f"{N}/{N}")
         yield _pad(Ys, Ls, width1, width2), Ls, names
     else:
-        for i in range(0, N, batch_size):
-            Ys, Ls, names = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch, readonly=True)
+        for i, (Ys, Ls, names) in zip(range(0, N, batch_size), batches):
             logger(f"{i}/{N}")
             yield _pad(Ys, Ls, width1, width2), Ls, names
 
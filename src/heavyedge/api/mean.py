@@ -12,7 +12,7 @@ __all__ = [
 ]
 
 
-def mean_euclidean(f, batch_size=None, logger=lambda x: None):
+def mean_euclidean(f, batch_size=None, logger=lambda x: None, prefetch=None):
     """Compute arithmetic mean profile.
 
     Parameters
@@ -24,6 +24,9 @@ def mean_euclidean(f, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Returns
     -------
@@ -43,21 +46,23 @@ def mean_euclidean(f, batch_size=None, logger=lambda x: None):
     """
     N, M = f.shape()
     if batch_size is None:
-        Ys, _, _ = f[:]
+        Ys, _, _ = f._view(slice(None))
         mean = np.mean(Ys, axis=0, dtype=np.float64)
         logger(f"{N}/{N}")
     else:
         mean = np.zeros((M,), dtype=np.float64)
 
-        for i in range(0, N, batch_size):
-            Ys, _, _ = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch, readonly=True)
+        for i, (Ys, _, _) in zip(range(0, N, batch_size), batches):
             mean += np.sum(Ys, axis=0)
             logger(f"{i}/{N}")
         mean /= N
     return mean
 
 
-def mean_wasserstein(f, grid_num, batch_size=None, logger=lambda x: None):
+def mean_wasserstein(
+    f, grid_num, batch_size=None, logger=lambda x: None, dtype=None, prefetch=None
+):
     """Compute mean profile by Fréchet mean with respect to Wasserstein metric.
 
     Parameters
@@ -71,6 +76,13 @@ def mean_wasserstein(f, grid_num, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    dtype : data-type, optional
+        Floating point type to load profiles and return the average profile.
+        Areas and quantile functions are accumulated in float64 regardless.
+        If not passed, the data type of *f* is used.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Returns
     -------
@@ -99,20 +111,23 @@ def mean_wasserstein(f, grid_num, batch_size=None, logger=lambda x: None):
     """
     x = f.x()
     t = np.linspace(0, 1, grid_num)
+    if dtype is None:
+        dtype = f.dtype()
 
     N = len(f)
     DEPRECATED = False
     if batch_size is None:
-        Ys, Ls, _ = f[:]
+        Ys, Ls, _ = f._view(slice(None))
+        Ys = Ys.astype(dtype, copy=False)
         # zero filling: will be removed in v2.0
         _, M = Ys.shape
         mask = np.arange(M)[None, :] >= Ls[:, None]
         if np.any(Ys[mask] != 0):
             DEPRECATED = True
-            Ys[mask] = 0
+            Ys = np.where(mask, 0, Ys)
         # zero filling complete.
         As = np.trapezoid(Ys, x, axis=-1)
-        fs = Ys / As[:, np.newaxis]
+        fs = Ys / As[:, np.newaxis].astype(dtype)
         mean, L = wmean(x, fs, Ls, t)
         mean_A = As.mean()
         logger(f"{N}/{N}")
@@ -120,17 +135,18 @@ def mean_wasserstein(f, grid_num, batch_size=None, logger=lambda x: None):
         g = np.zeros((grid_num,), dtype=np.float64)
         mean_A = 0
 
-        for i in range(0, N, batch_size):
-            Ys, Ls, _ = f[i : i + batch_size]
+        batches = f.iter_batches(batch_size, prefetch, readonly=True)
+        for i, (Ys, Ls, _) in zip(range(0, N, batch_size), batches):
+            Ys = Ys.astype(dtype, copy=False)
             # zero filling: will be removed in v2.0
             _, M = Ys.shape
             mask = np.arange(M)[None, :] >= Ls[:, None]
             if np.any(Ys[mask] != 0):
                 DEPRECATED = True
-                Ys[mask] = 0
+                Ys = np.where(mask, 0, Ys)
             # zero filling complete.
             As = np.trapezoid(Ys, x, axis=-1)
-            fs = Ys / As[:, np.newaxis]
+            fs = Ys / As[:, np.newaxis].astype(dtype)
             Qs = quantile(x, fs, Ls, t)
             g += np.sum(Qs, axis=0)
             mean_A += np.sum(As)
@@ -147,4 +163,4 @@ def mean_wasserstein(f, grid_num, batch_size=None, logger=lambda x: None):
             stacklevel=2,
         )
 
-    return mean * mean_A, L
+    return (mean * mean_A).astype(dtype), L
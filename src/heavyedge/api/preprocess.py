@@ -1,11 +1,21 @@
 """Profile preprocessing."""
 
+import bisect
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
-from heavyedge.profile import fill_after, preprocess
+from heavyedge.io._readahead import read_ahead
+from heavyedge.profile import decimate as _decimate
+from heavyedge.profile import fill_after, preprocess, preprocess_sweep
 
 __all__ = [
     "prep",
+    "prep_sweep",
     "fill",
 ]
 
@@ -18,6 +28,18 @@ def prep(
     z_thres=None,
     batch_size=None,
     logger=lambda x: None,
+    readers=None,
+    prefetch=None,
+    exclude=None,
+    workers=None,
+    filter="fir",
+    coarse=None,
+    dtype=None,
+    z_window=None,
+    decimate=None,
+    reference=None,
+    return_areas=False,
+    spill_dir=None,
 ):
     """Preprocess raw profiles in the given file.
 
@@ -35,11 +57,64 @@ def prep(
     z_thres : scalar, optional
         Z-score threshold to detect outliers.
         If not passed, outlier detection is not performed.
+        If passed, preprocessed profiles are kept in a temporary file in
+        *spill_dir* until all profiles are processed.
     batch_size : int, optional
         Batch size to load data.
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    readers : int, optional
+        Number of threads to read raw data in background.
+        If not passed, one thread is used when *prefetch* is passed.
+    prefetch : int, optional
+        Number of batches to read ahead while the current batch is processed.
+        If not passed, equals to *readers*. If both *readers* and *prefetch* are
+        not passed, raw data are read in the main thread without read-ahead.
+    exclude : array-like of str, optional
+        Names of raw profiles which are not preprocessed, e.g., profiles which
+        are already processed. Outlier detection is performed without them.
+    workers : int, optional
+        Number of processes to preprocess profiles. Each batch is split among the
+        processes, and the next batch is read while the current one is processed.
+        Results are yielded in the order of raw profiles. Processes are started
+        by 'forkserver' method, or 'spawn' where it is not available.
+        If not passed, profiles are preprocessed in the main process.
+    filter : {'fir', 'iir'}
+        Implementation of Gaussian filter to detect contact point.
+        Refer to :func:`heavyedge.profile.preprocess`.
+    coarse : int, optional
+        Decimation factor for coarse-to-fine detection of contact point.
+        Refer to :func:`heavyedge.profile.preprocess`.
+    dtype : data-type, optional
+        Floating point type to preprocess and yield profiles, e.g., ``np.float32``.
+        If not passed, the data type of raw profiles is used.
+    z_window : int, optional
+        Number of recent profiles to detect outliers with *z_thres*.
+        If passed, each profile is accepted or rejected as it arrives by comparing
+        it with the last *z_window* profiles including itself, without keeping the
+        preprocessed profiles in a temporary file.
+        If not passed, outliers are detected among all profiles.
+    decimate : int, optional
+        Decimation factor of preprocessed profiles. If passed, the profiles are
+        decimated by :func:`heavyedge.profile.decimate` after the contact points are
+        detected at full resolution, and their spatial resolution is divided by
+        *decimate*.
+    reference : array-like, optional
+        Areas of profiles which are already accepted, e.g., profiles in the file
+        being appended to, as yielded with *return_areas*. Outliers are detected
+        with *z_thres* among these values together with the new profiles; with
+        *z_window*, the last values fill the window first. Reference profiles are
+        not yielded.
+    return_areas : bool, default=False
+        If True, also yields the areas of the preprocessed profiles which are
+        compared to detect outliers.
+    spill_dir : pathlike, optional
+        Directory to create the temporary file for outlier detection with *z_thres*
+        and without *z_window*. The file is as large as all preprocessed profiles,
+        so the directory should be on disk for the memory to be bounded by the
+        batch size. If not passed, the default directory of :mod:`tempfile` is
+        used, which may be in memory (e.g., tmpfs).
 
     Yields
     ------
@@ -49,6 +124,9 @@ def prep(
         Lengths of the preprocessed profiles.
     names : (batch_size,) array
         Names of the preprocessed profiles.
+    areas : (batch_size,) array
+        Sums of the profiles until their contact points, at the resolution of raw
+        profiles. Only yielded if *return_areas* is True.
 
     Examples
     --------
@@ -60,55 +138,274 @@ def prep(
     ... for Y, L in zip(Ys, Ls):
     ...     plt.plot(Y[:L])
     """
-    if z_thres is not None:
-        gen = _prep_outlier(raw_file, sigma, std_thres, z_thres)
+    if exclude is None:
+        N = len(raw_file)
+        idxs = None
+    else:
+        (idxs,) = np.nonzero(~np.isin(raw_file.names(), np.asarray(exclude, dtype=str)))
+        N = len(idxs)
+    if batch_size is None:
+        batch_size = max(N, 1)
+    if idxs is None:
+        keys = [slice(i, min(i + batch_size, N)) for i in range(0, N, batch_size)]
     else:
-        gen = _prep(raw_file, sigma, std_thres)
+        keys = [idxs[i : i + batch_size] for i in range(0, N, batch_size)]
 
-    N = len(raw_file)
-    batch_count = 0
-    Ys, Ls, names = [], [], []
-    for i, (Y, L, name) in enumerate(gen):
-        if fill_value is not None:
-            Y[L:] = fill_value
-        Ys.append(Y)
-        Ls.append(L)
-        names.append(name)
-        batch_count += 1
+    kwargs = dict(
+        sigma=sigma,
+        std_thres=std_thres,
+        readers=readers,
+        prefetch=prefetch,
+        workers=workers,
+        filter=filter,
+        coarse=coarse,
+        dtype=dtype,
+    )
+    if z_thres is not None and z_window is not None:
+        gen = _prep_online_outlier(
+            raw_file, keys, z_thres, z_window, reference, **kwargs
+        )
+    elif z_thres is not None:
+        gen = _prep_outlier(
+            raw_file, keys, z_thres, batch_size, reference, spill_dir, **kwargs
+        )
+    else:
+        gen = _prep(raw_file, keys, **kwargs)
 
-        if batch_count == batch_size:
-            logger(f"{i}/{N}")
+    for i, (Ys, Ls, names) in gen:
+        if return_areas:
+            areas = _area_sums(Ys, Ls)
+        if decimate is not None:
+            Ys, Ls = _decimate(Ys, Ls, decimate)
+        if fill_value is not None:
+            fill_after(Ys, Ls, fill_value)
+        logger(f"{i}/{N}")
+        if return_areas:
+            yield Ys, Ls, names, areas
+        else:
             yield Ys, Ls, names
-            Ys, Ls, names = [], [], []
-            batch_count = 0
-
-    # yield remaining batch
-    logger(f"{N}/{N}")
-    yield Ys, Ls, names
-
-
-def _prep_outlier(raw, sigma, std_thres, z_thres):
-    idxs, Ls, sums = [], [], []
-    for i in range(len(raw)):
-        Y, _ = raw[i]
-        if _is_invalid(Y):
-            continue
-        (Y,), (L,) = preprocess(Y.reshape(1, -1), sigma, std_thres)
-        idxs.append(i)
-        Ls.append(L)
-        sums.append(np.sum(Y[:L]))
-    sums = np.array(sums)
-    is_outlier = _outlier(sums, z_thres)
-    idxs = np.array(idxs)[~is_outlier]
-    Ls = np.array(Ls)[~is_outlier]
-
-    # yield
-    for i, L in zip(idxs, Ls):
-        Y, name = raw[i]
-        if Y[0] < Y[-1]:
-            Y = np.flip(Y)
-        Y = Y - Y[L - 1]
-        yield Y, L, name
+
+
+def prep_sweep(
+    raw_file,
+    sigmas,
+    std_thresholds,
+    filter="fir",
+    batch_size=None,
+    logger=lambda x: None,
+    readers=None,
+    prefetch=None,
+):
+    """Detect contact points of raw profiles for every pair of parameters.
+
+    Each raw profile is read once, and filtered once per sigma.
+
+    Parameters
+    ----------
+    raw_file : heavyedge.RawProfileBase
+        Opened raw profile file.
+    sigmas : (S,) array-like
+        Standard deviations of Gaussian filter for smoothing.
+    std_thresholds : (T,) array-like
+        Standard deviation thresholds to detect contact point.
+    filter : {'fir', 'iir'}
+        Implementation of Gaussian filter to detect contact point.
+    batch_size : int, optional
+        Batch size to load data.
+        If not passed, all data are loaded at once.
+    logger : callable, optional
+        Logger function which accepts a progress message string.
+    readers, prefetch : int, optional
+        Threads and batches to read raw data ahead. Refer to :func:`prep`.
+
+    Yields
+    ------
+    Ls : (batch_size, S, T) array
+        Lengths of the profiles until the contact point for each pair of parameters.
+    names : (batch_size,) array
+        Names of the profiles.
+
+    See Also
+    --------
+    heavyedge.profile.preprocess_sweep : Sweep parameters for profile array.
+
+    Examples
+    --------
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.api import prep_sweep
+    >>> raw = RawProfileCsvs(get_sample_path("Type3"))
+    >>> Ls, names = next(prep_sweep(raw, [16, 32], [0.01, 0.1], batch_size=3))
+    >>> Ls.shape
+    (3, 2, 2)
+    """
+    N = len(raw_file)
+    if batch_size is None:
+        batch_size = max(N, 1)
+    keys = [slice(i, min(i + batch_size, N)) for i in range(0, N, batch_size)]
+    count = 0
+    for Ys, names in _read_ahead(raw_file, keys, readers, prefetch):
+        count += len(Ys)
+        valid = ~_is_invalid(Ys)
+        Ls = preprocess_sweep(Ys[valid], sigmas, std_thresholds, filter)
+        logger(f"{count}/{N}")
+        yield Ls, names[valid]
+
+
+def _read_ahead(raw, keys, readers=None, prefetch=None):
+    # Yield batches of raw data for each key in order, while reading next batches in
+    # threads.
+    if readers is None and prefetch is None:
+        for key in keys:
+            yield raw.read_batch(key)
+        return
+
+    if readers is None:
+        readers = 1
+    if prefetch is None:
+        prefetch = readers
+    yield from read_ahead(raw.read_batch, keys, readers, prefetch)
+
+
+def _prep_outlier(
+    raw, keys, z_thres, batch_size, reference=None, spill_dir=None, **kwargs
+):
+    # Preprocessed profiles are spilled to a temporary file, so that each raw
+    # profile is read only once while the memory usage is bounded by the batch size.
+    N = sum(
+        len(key) if isinstance(key, np.ndarray) else len(range(len(raw))[key])
+        for key in keys
+    )
+    with tempfile.TemporaryDirectory(dir=spill_dir) as tmpdir:
+        spill, count = None, 0
+        try:
+            Ls, names, sums = [], [], []
+            for _, (Ys, Ls_batch, names_batch) in _prep(raw, keys, **kwargs):
+                if len(Ys) == 0:
+                    continue
+                if spill is None:
+                    spill = np.lib.format.open_memmap(
+                        os.path.join(tmpdir, "spill.npy"),
+                        mode="w+",
+                        dtype=Ys.dtype,
+                        shape=(N, Ys.shape[1]),
+                    )
+                spill[count : count + len(Ys)] = Ys
+                count += len(Ys)
+                Ls.append(Ls_batch)
+                names.append(names_batch)
+                sums.append(_area_sums(Ys, Ls_batch))
+            if spill is None:
+                return
+            if reference is not None:
+                sums.insert(0, np.asarray(reference, dtype=np.float64))
+            Ls, names, sums = (
+                np.concatenate(Ls),
+                np.concatenate(names),
+                np.concatenate(sums),
+            )
+            (idxs,) = np.nonzero(~_outlier(sums, z_thres)[len(sums) - len(Ls) :])
+
+            # yield
+            for i in range(0, len(idxs), batch_size):
+                idx = idxs[i : i + batch_size]
+                yield min(i + batch_size, len(idxs)), (spill[idx], Ls[idx], names[idx])
+        finally:
+            # Release the memory map before deleting the file, also when the
+            # consumer stops early.
+            del spill
+
+
+def _prep_online_outlier(raw, keys, z_thres, z_window, reference=None, **kwargs):
+    is_outlier = _RollingOutlier(z_window, z_thres)
+    if reference is not None:
+        for value in np.asarray(reference, dtype=np.float64)[-z_window:]:
+            is_outlier(value)
+    for count, (Ys, Ls, names) in _prep(raw, keys, **kwargs):
+        keep = ~np.array([is_outlier(v) for v in _area_sums(Ys, Ls)], dtype=bool)
+        yield count, (Ys[keep], Ls[keep], names[keep])
+
+
+class _RollingOutlier:
+    """Outlier detection of :func:`_outlier` over a rolling window.
+
+    Calling the object with a value adds it to the window of the last *window*
+    values, and returns whether the value is an outlier among the window. The window
+    is kept sorted, so that the median is read directly and the median absolute
+    deviation is found by binary search over the deviations, which are two sorted
+    sequences on both sides of the median.
+
+    Each call takes O(log *window*) comparisons, and O(*window*) time to shift the
+    elements of the sorted list when a value is inserted or removed. The cost per
+    value and the memory are thus bounded by the window size, regardless of the
+    number of values seen, but are not constant in the window size.
+    """
+
+    def __init__(self, window, thres=3.5):
+        if window < 1:
+            raise ValueError(f"Window size must be positive: {window}")
+        self.window = window
+        self.thres = thres
+        self._queue = deque()
+        self._sorted = []
+
+    def __call__(self, value):
+        self._queue.append(value)
+        bisect.insort(self._sorted, value)
+        if len(self._queue) > self.window:
+            old = self._queue.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+
+        med = self._median()
+        mad = self._mad(med)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mod_z = 0.6745 * (value - med) / np.float64(mad)
+        return bool(np.abs(mod_z) > self.thres)
+
+    def _median(self):
+        x, n = self._sorted, len(self._sorted)
+        if n % 2:
+            return x[n // 2]
+        return (x[n // 2 - 1] + x[n // 2]) / 2
+
+    def _mad(self, med):
+        x, n = self._sorted, len(self._sorted)
+        split = bisect.bisect_left(x, med)
+        n_left, n_right = split, n - split
+
+        # Deviations in ascending order on each side of the median.
+        def left(i):
+            return med - x[split - 1 - i]
+
+        def right(j):
+            return x[split + j] - med
+
+        def kth(k):
+            # k-th (0-based) smallest deviation of both sides. Binary search for
+            # the number of the k + 1 smallest deviations taken from the left side.
+            lo, hi = max(0, k + 1 - n_right), min(k + 1, n_left)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if left(i) < right(k - i):
+                    lo = i + 1
+                else:
+                    hi = i
+            i, j = lo, k + 1 - lo
+            return max(
+                left(i - 1) if i > 0 else -np.inf,
+                right(j - 1) if j > 0 else -np.inf,
+            )
+
+        if n % 2:
+            return kth(n // 2)
+        return (kth(n // 2 - 1) + kth(n // 2)) / 2
+
+
+def _area_sums(Ys, Ls):
+    # Sums of profiles until the contact points, which are compared to detect
+    # outliers.
+    filled = Ys.copy()
+    fill_after(filled, Ls, 0)
+    return np.sum(filled, axis=1, dtype=np.float64)
 
 
 def _outlier(values, thres=3.5):
@@ -120,20 +417,79 @@ def _outlier(values, thres=3.5):
     return np.abs(mod_z) > thres
 
 
-def _prep(raw, sigma, std_thres):
-    for i in range(len(raw)):
-        Y, name = raw[i]
-        if _is_invalid(Y):
-            continue
-        (Y,), (L,) = preprocess(Y.reshape(1, -1), sigma, std_thres)
-        yield Y, L, name
+def _prep(
+    raw,
+    keys,
+    sigma,
+    std_thres,
+    readers=None,
+    prefetch=None,
+    workers=None,
+    filter="fir",
+    coarse=None,
+    dtype=None,
+):
+    if workers is None:
+        count = 0
+        for Ys, names in _read_ahead(raw, keys, readers, prefetch):
+            count += len(Ys)
+            if dtype is not None:
+                Ys = Ys.astype(dtype, copy=False)
+            valid = ~_is_invalid(Ys)
+            if not np.any(valid):
+                # Batch of empty profiles does not have the profile length.
+                continue
+            Ys, Ls = preprocess(Ys[valid], sigma, std_thres, filter, coarse)
+            yield count, (Ys, Ls, names[valid])
+        return
+
+    def collect(count, futures, names):
+        results = [f.result() for f in futures]
+        Ys = np.concatenate([Ys for Ys, _ in results])
+        Ls = np.concatenate([Ls for _, Ls in results])
+        return count, (Ys, Ls, names)
+
+    # Reader threads may be running, which a forked process would inherit in an
+    # arbitrary state. Start the workers from a clean process instead.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+    else:
+        context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(workers, mp_context=context)
+    pending = deque()
+    try:
+        count = 0
+        for Ys, names in _read_ahead(raw, keys, readers, prefetch):
+            count += len(Ys)
+            if dtype is not None:
+                Ys = Ys.astype(dtype, copy=False)
+            valid = ~_is_invalid(Ys)
+            if not np.any(valid):
+                continue
+            Ys = Ys[valid]
+            chunks = np.array_split(Ys, min(workers, len(Ys)))
+            futures = [
+                executor.submit(preprocess, chunk, sigma, std_thres, filter, coarse)
+                for chunk in chunks
+            ]
+            pending.append((count, futures, names[valid]))
+            # Preprocessing of the current batch overlaps reading of the next one.
+            if len(pending) > 1:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
-def _is_invalid(profile):
-    return (len(profile) == 0) or np.any(np.isnan(profile)) or np.any(np.isinf(profile))
+def _is_invalid(profiles):
+    # Rows of 2-D array which are empty or contain nan or inf.
+    return np.logical_not(np.all(np.isfinite(profiles), axis=1)) | (
+        profiles.shape[1] == 0
+    )
 
 
-def fill(file, fill_value, batch_size=None, logger=lambda x: None):
+def fill(file, fill_value, batch_size=None, logger=lambda x: None, prefetch=None):
     """Fill profiles after the contact point.
 
     Parameters
@@ -147,6 +503,9 @@ def fill(file, fill_value, batch_size=None, logger=lambda x: None):
         If not passed, all data are loaded at once.
     logger : callable, optional
         Logger function which accepts a progress message string.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the current
+        batch is processed. Ignored if *batch_size* is not passed.
 
     Yields
     ------
@@ -175,8 +534,8 @@ def fill(file, fill_value, batch_size=None, logger=lambda x: None):
         logger(f"{N}/{N}")
         yield Ys, Ls, names
     else:
-        for i in range(0, N, batch_size):
-            Ys, Ls, names = file[i : i + batch_size]
+        batches = file.iter_batches(batch_size, prefetch)
+        for i, (Ys, Ls, names) in zip(range(0, N, batch_size), batches):
             fill_after(Ys, Ls, fill_value)
             logger(f"{i}/{N}")
             yield Ys, Ls, names
@@ -1,10 +1,21 @@
 """Data file I/O."""
 
 from .profile import ProfileData
-from .raw import RawProfileBase, RawProfileCsvs
+from .raw import (
+    RawProfileArchive,
+    RawProfileBase,
+    RawProfileCsvs,
+    RawProfileHdf5,
+    RawProfileNpy,
+    RawProfileWideCsv,
+)
 
 __all__ = [
     "RawProfileBase",
     "RawProfileCsvs",
+    "RawProfileWideCsv",
+    "RawProfileArchive",
+    "RawProfileNpy",
+    "RawProfileHdf5",
     "ProfileData",
 ]
@@ -0,0 +1,41 @@
+"""Read-ahead of batches in background threads."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = [
+    "read_ahead",
+]
+
+
+def read_ahead(read, keys, threads=1, prefetch=1):
+    """Yield ``read(key)`` for each key in order, reading next keys in threads.
+
+    Parameters
+    ----------
+    read : callable
+        Function which reads a batch with a key.
+    keys : iterable
+        Keys of batches.
+    threads : int, default=1
+        Number of threads to read batches.
+    prefetch : int, default=1
+        Maximum number of batches read ahead of the consumer.
+
+    Yields
+    ------
+    object
+        Result of *read* for each key.
+    """
+    executor = ThreadPoolExecutor(threads)
+    futures = deque()
+    try:
+        for key in keys:
+            futures.append(executor.submit(read, key))
+            # At most *prefetch* batches are loaded ahead of the consumer.
+            if len(futures) > prefetch:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -8,6 +8,8 @@ from pathlib import Path
 import h5py
 import numpy as np
 
+from ._readahead import read_ahead
+
 __all__ = [
     "ProfileData",
 ]
@@ -42,13 +44,34 @@ class ProfileData:
     mode : {'r', 'w', 'r+', 'a', 'w-'}
         Mode to open the file.
     kwargs : dict
-        Optional arguments passed to :class:`h5py.File`.
+        Optional arguments passed to :class:`h5py.File`, e.g., *rdcc_nbytes* and
+        *rdcc_nslots* to set the chunk cache.
 
     Notes
     -----
     ``self[key]`` returns a tuple of full profile data, profile length(s) and
     profile name(s). If ``key`` is a sequence, it must be sorted in ascending order.
 
+    Profiles are stored either padded to the same length, or in ragged layout where
+    only the first ``L`` values of each profile are concatenated. Profiles in ragged
+    layout are padded with the fill value set by :meth:`create` when indexed.
+
+    Datasets grow geometrically as profiles are written, and are trimmed to the
+    written profiles when the file is closed. Use the object as a context manager or
+    call :meth:`close` to trim the file. Until then, the number of written profiles
+    is stored in the file, so that a file which is being written or whose writer
+    was interrupted is read without the preallocated rows. Contiguous profile
+    dataset, which can be memory-mapped by :meth:`memmap`, is not resized from the
+    capacity set by :meth:`create`.
+
+    h5py holds the GIL while reading the file, so reading in background thread by
+    :meth:`iter_batches` overlaps only with computations releasing the GIL, unless
+    contiguous profiles are read from memory map.
+
+    Profiles are read and written by chunks. If the chunks set by :meth:`create`
+    are larger than the default chunk cache of 1 MiB, pass larger *rdcc_nbytes*
+    to keep a chunk in memory while its profiles are read in batches.
+
     Examples
     --------
     >>> from heavyedge import get_sample_path, ProfileData
@@ -61,17 +84,34 @@ class ProfileData:
     def __init__(self, path, mode="r", **kwargs):
         self.path = Path(path).expanduser()
         self._file = h5py.File(path, mode, **kwargs)
+        # Number of written profiles and values, if datasets may be larger than that.
+        # They are also stored as attributes until the datasets are trimmed, so that
+        # the preallocated rows are excluded if the writer did not close the file.
+        self._count, self._nvalues = (
+            int(self._file.attrs[key]) if key in self._file.attrs else None
+            for key in ["count", "nvalues"]
+        )
+        self._ragged = "values" in self._file
+        self._memmap = None
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, trace_back):
-        self._file.close()
+        self.close()
 
     def __len__(self):
         return self.shape()[0]
 
     def __getitem__(self, key):
+        # Exclude preallocated rows, and resolve offsets of ragged profiles.
+        N, M = self.shape()
+        if isinstance(key, numbers.Integral):
+            key = range(N)[key]
+        elif isinstance(key, slice):
+            key = slice(*key.indices(N))
+        if self.is_ragged():
+            return self._getitem_ragged(key, M)
         if isinstance(key, numbers.Integral):
             profile = self._file["profiles"][key]
             length = self._file["len"][key]
@@ -87,10 +127,87 @@ class ProfileData:
         else:
             raise TypeError(f"Invalid index type: {type(key)}")
 
+    def _getitem_ragged(self, key, M):
+        fill_value = self._file.attrs["fill_value"]
+        values, offsets = self._file["values"], self._file["offsets"]
+        if isinstance(key, numbers.Integral):
+            offset, length = offsets[key], self._file["len"][key]
+            profile = np.full(M, fill_value, dtype=values.dtype)
+            profile[:length] = values[offset : offset + length]
+            name = str(self._file["names"][key], encoding="utf-8")
+            return (profile, length, name)
+        elif isinstance(key, slice) and key.step in (None, 1):
+            lengths = self._file["len"][key]
+            profiles = np.full((len(lengths), M), fill_value, dtype=values.dtype)
+            if len(lengths) > 0:
+                # Consecutive profiles are read at once.
+                offsets = offsets[key]
+                flat = values[offsets[0] : offsets[-1] + lengths[-1]]
+                profiles[np.arange(M) < lengths[:, np.newaxis]] = flat
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            lengths = self._file["len"][key]
+            profiles = np.full((len(lengths), M), fill_value, dtype=values.dtype)
+            for profile, offset, length in zip(profiles, offsets[key], lengths):
+                profile[:length] = values[offset : offset + length]
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+        names = np.char.decode(self._file["names"][key].astype("S"), encoding="utf-8")
+        return (profiles, lengths, names)
+
+    def _view(self, key):
+        # Same as self[key], but profiles are read-only view of memmap if possible.
+        if self._memmap is None:
+            try:
+                self._memmap = self.memmap()
+            except ValueError:
+                self._memmap = False
+        if self._memmap is False:
+            return self[key]
+        if isinstance(key, slice):
+            key = slice(*key.indices(len(self)))
+        profiles = self._memmap[key]
+        lengths = self._file["len"][key]
+        names = np.char.decode(self._file["names"][key].astype("S"), encoding="utf-8")
+        return (profiles, lengths, names)
+
+    def _row_datasets(self):
+        if self.is_ragged():
+            return ["offsets", "len", "names"]
+        elif self._file["profiles"].maxshape[0] is not None:
+            # Contiguous dataset
+            return ["len", "names"]
+        return ["profiles", "len", "names"]
+
     def close(self):
+        """Trim datasets to the written profiles and close the file."""
+        if self._count is not None and self._file and self._file.mode != "r":
+            for key in self._row_datasets():
+                if self._file[key].shape[0] != self._count:
+                    self._file[key].resize(self._count, axis=0)
+            if self.is_ragged() and len(self._file["values"]) != self._nvalues:
+                self._file["values"].resize(self._nvalues, axis=0)
+            for key in ["count", "nvalues"]:
+                if key in self._file.attrs:
+                    del self._file.attrs[key]
+            self._count = None
+            self._nvalues = None
+        self._memmap = None
         self._file.close()
 
-    def create(self, M, resolution, name=None):
+    def create(
+        self,
+        M,
+        resolution,
+        name=None,
+        dtype=float,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        capacity=0,
+        ragged=False,
+        fill_value=0.0,
+    ):
         """Create datasets and write metadata.
 
         Parameters
@@ -101,6 +218,35 @@ class ProfileData:
             Spatial resolution of the profile data.
         name : str, optional
             Unique name to identify the dataset.
+        dtype : data-type, default=float
+            Floating point type of the profile data, e.g., ``np.float32``.
+        chunks : int or tuple of int, optional
+            Chunk shape of the profile dataset. If int, number of profiles in each
+            chunk. If not passed, each chunk contains full profiles, whose number is
+            the largest power of two fitting in 1 MiB, so that batches of power of
+            two sizes are aligned to chunks.
+            If *ragged* is True, int is the number of values in each chunk and each
+            chunk is 1 MiB if not passed.
+            If False, profiles are stored contiguously without compression, so that
+            they can be memory-mapped. The dataset cannot grow beyond *capacity*,
+            and the space of *capacity* profiles stays allocated in the file even if
+            fewer profiles are written.
+        compression : {'gzip', 'lzf'}, optional
+            Compression filter of the profile dataset.
+            If not passed, profiles are not compressed.
+        compression_opts : int, optional
+            Compression level of 'gzip' filter, from 0 to 9.
+        shuffle : bool, default=False
+            Whether to apply byte shuffle filter before compression.
+        capacity : int, default=0
+            Number of profiles to preallocate, e.g., the expected number of
+            profiles. Datasets are trimmed to the written profiles on close.
+        ragged : bool, default=False
+            If True, only the values of each profile before its length are stored,
+            saving the space of the values after the contact points.
+        fill_value : scalar, default=0.0
+            Value to pad the profiles in ragged layout after their lengths when read.
+            Ignored if *ragged* is False.
 
         Returns
         -------
@@ -112,24 +258,66 @@ class ProfileData:
         self._file.attrs["name"] = name
         self._file.attrs["res"] = resolution
 
-        self._file.create_dataset(
-            "profiles",
-            (0, M),
-            maxshape=(None, M),
-            dtype=float,
-        )
+        if ragged:
+            if chunks is False:
+                raise ValueError("Ragged profiles cannot be stored contiguously.")
+            self._file.attrs["M"] = M
+            self._file.attrs["fill_value"] = fill_value
+            if chunks is None:
+                chunks = (2**20) // np.dtype(dtype).itemsize
+            if isinstance(chunks, numbers.Integral):
+                chunks = (int(chunks),)
+            self._file.create_dataset(
+                "values",
+                (0,),
+                maxshape=(None,),
+                dtype=dtype,
+                chunks=chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+            )
+            self._file.create_dataset(
+                "offsets",
+                (capacity,),
+                maxshape=(None,),
+                dtype=int,
+            )
+            self._nvalues = 0
+            self._file.attrs["nvalues"] = 0
+            self._ragged = True
+        else:
+            if chunks is False and (compression is not None or shuffle):
+                raise ValueError("Contiguous profiles cannot be compressed.")
+            if chunks is None:
+                rows = max((2**20) // max(M * np.dtype(dtype).itemsize, 1), 1)
+                chunks = 2 ** int(np.log2(rows))
+            if isinstance(chunks, numbers.Integral) and chunks is not False:
+                chunks = (int(chunks), max(M, 1))
+            self._file.create_dataset(
+                "profiles",
+                (capacity, M),
+                maxshape=None if chunks is False else (None, M),
+                dtype=dtype,
+                chunks=None if chunks is False else chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+            )
         self._file.create_dataset(
             "len",
-            (0,),
+            (capacity,),
             maxshape=(None,),
             dtype=int,
         )
         self._file.create_dataset(
             "names",
-            (0,),
+            (capacity,),
             maxshape=(None,),
             dtype=h5py.string_dtype(),
         )
+        self._count = 0
+        self._file.attrs["count"] = 0
         return self
 
     def name(self):
@@ -157,7 +345,65 @@ class ProfileData:
         -------
         (N, M)
         """
-        return self._file["profiles"].shape
+        if self._count is not None:
+            N = self._count
+        else:
+            N = len(self._file["len"])
+        if self.is_ragged():
+            M = int(self._file.attrs["M"])
+        else:
+            M = self._file["profiles"].shape[1]
+        return (N, M)
+
+    def dtype(self):
+        """Data type of profile dataset.
+
+        Returns
+        -------
+        numpy.dtype
+        """
+        if self.is_ragged():
+            return self._file["values"].dtype
+        return self._file["profiles"].dtype
+
+    def is_ragged(self):
+        """Whether the profiles are stored in ragged layout.
+
+        Returns
+        -------
+        bool
+        """
+        return self._ragged
+
+    def memmap(self):
+        """Memory-mapped view of the profiles.
+
+        Only available for contiguous profiles, i.e., created with ``chunks=False``.
+        Profiles are read by the operating system when the view is accessed,
+        without being copied by HDF5.
+
+        Returns
+        -------
+        (N, M) numpy.memmap
+            Read-only view of the profiles.
+
+        Raises
+        ------
+        ValueError
+            If the profiles are not stored contiguously.
+        """
+        shape = self.shape()
+        if self.is_ragged() or self._file["profiles"].chunks is not None:
+            raise ValueError("Profiles are not stored contiguously.")
+        dataset = self._file["profiles"]
+        offset = dataset.id.get_offset()
+        if offset is None:
+            # Storage is not allocated until the first write.
+            return np.empty(shape, dtype=dataset.dtype)
+        self._file.flush()
+        return np.memmap(
+            self.path, dtype=dataset.dtype, mode="r", offset=offset, shape=shape
+        )
 
     def x(self):
         """Spatial coordinates.
@@ -181,18 +427,101 @@ class ProfileData:
             Profile names.
         """
         N = len(profiles)
+        if N == 0:
+            return
+
+        if self._count is None:
+            self._count = len(self._file["len"])
+        start, stop = self._count, self._count + N
+        if not self.is_ragged() and self._file["profiles"].maxshape[0] is not None:
+            capacity = self._file["profiles"].maxshape[0]
+            if stop > capacity:
+                raise ValueError(
+                    f"Contiguous profiles dataset is full (capacity: {capacity})."
+                )
+        capacity = len(self._file["len"])
+        if stop > capacity:
+            # Geometric growth for amortized constant number of resizing.
+            capacity = max(stop, 2 * capacity)
+            for key in self._row_datasets():
+                self._file[key].resize(capacity, axis=0)
+        if self.is_ragged():
+            lengths = np.asarray(lengths)
+            if self._nvalues is None:
+                self._nvalues = len(self._file["values"])
+            offsets = self._nvalues + np.cumsum(lengths) - lengths
+            values = profiles[np.arange(profiles.shape[1]) < lengths[:, np.newaxis]]
+            v_start, v_stop = self._nvalues, self._nvalues + len(values)
+            v_capacity = len(self._file["values"])
+            if v_stop > v_capacity:
+                self._file["values"].resize(max(v_stop, 2 * v_capacity), axis=0)
+            self._file["values"][v_start:v_stop] = values
+            self._file["offsets"][start:stop] = offsets
+            self._nvalues = v_stop
+        else:
+            self._file["profiles"][start:stop] = profiles
+        self._file["len"][start:stop] = lengths
+        self._file["names"][start:stop] = names
+        self._count = stop
+        # Count is updated after the profiles, and flushed with them.
+        self._file.attrs["count"] = stop
+        if self.is_ragged():
+            self._file.attrs["nvalues"] = self._nvalues
+        self._file.flush()
+        self._memmap = None
+
+    def iter_batches(self, batch_size=None, prefetch=None, readonly=False):
+        """Yield consecutive batches of profiles.
 
-        dset = self._file["profiles"]
-        dset.resize(dset.shape[0] + N, axis=0)
-        dset[-N:] = profiles
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of profiles in each batch.
+            If not passed, all profiles are yielded as a single batch.
+        prefetch : int, optional
+            Number of batches to read ahead in a background thread while the current
+            batch is processed. If not passed, batches are read when requested.
+        readonly : bool, default=False
+            If True, contiguous profiles are yielded as read-only views of
+            :meth:`memmap` instead of copies. With *prefetch*, the pages of the views
+            are loaded into memory by the background thread.
 
-        dset = self._file["len"]
-        dset.resize(dset.shape[0] + N, axis=0)
-        dset[-N:] = lengths
+        Yields
+        ------
+        profiles : (batch_size, M) array
+            Full profile data.
+        lengths : (batch_size,) array
+            Profile lengths.
+        names : (batch_size,) array
+            Profile names.
+
+        Examples
+        --------
+        >>> from heavyedge import get_sample_path, ProfileData
+        >>> with ProfileData(get_sample_path("Prep-Type3.h5")) as data:
+        ...     for Ys, Ls, names in data.iter_batches(10, prefetch=2):
+        ...         pass
+        """
+        N = len(self)
+        if batch_size is None:
+            batch_size = max(N, 1)
+        keys = [slice(i, i + batch_size) for i in range(0, N, batch_size)]
+        if prefetch is None:
+            read = self._view if readonly else self.__getitem__
+            for key in keys:
+                yield read(key)
+            return
+
+        def read(key):
+            if not readonly:
+                return self[key]
+            profiles, lengths, names = self._view(key)
+            if isinstance(profiles, np.memmap):
+                # Pages are loaded in this thread; NumPy releases the GIL to copy.
+                profiles = np.array(profiles)
+            return (profiles, lengths, names)
 
-        dset = self._file["names"]
-        dset.resize(dset.shape[0] + N, axis=0)
-        dset[-N:] = names
+        yield from read_ahead(read, keys, 1, prefetch)
 
     def profiles(self):
         """Yield profiles.
@@ -203,8 +532,13 @@ class ProfileData:
         ------
         1-D ndarray
         """
-        for profile, length in zip(self._file["profiles"], self._file["len"]):
-            yield profile[:length]
+        if self.is_ragged():
+            N = len(self)
+            for offset, length in zip(self._file["offsets"][:N], self._file["len"][:N]):
+                yield self._file["values"][offset : offset + length]
+            return
+        for i in range(len(self)):
+            yield self._file["profiles"][i][: self._file["len"][i]]
 
     @_deprecated("1.5", "__getitem__() method")
     def profile_names(self):
@@ -234,4 +568,4 @@ class ProfileData:
         (N, M) ndarray
             All N profiles data.
         """
-        return self._file["profiles"][:]
+        return self[:][0]
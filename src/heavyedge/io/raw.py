@@ -1,15 +1,34 @@
 """Raw profile data files."""
 
 import abc
+import bz2
 import csv
+import gzip
+import io
+import json
+import lzma
+import numbers
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
 import warnings
-from pathlib import Path
+import zipfile
+from collections.abc import Sequence
+from pathlib import Path, PurePosixPath
 
+import h5py
 import numpy as np
 
 __all__ = [
     "RawProfileBase",
     "RawProfileCsvs",
+    "RawProfileWideCsv",
+    "RawProfileArchive",
+    "RawProfileNpy",
+    "RawProfileHdf5",
 ]
 
 
@@ -32,6 +51,36 @@ def _deprecated(version, replace):
     return decorator
 
 
+def _read_csv_column(file):
+    """Parse the first column of CSV file as 1-D array."""
+    # Parse the whole file at once using NumPy's C tokenizer.
+    return np.loadtxt(
+        file,
+        dtype=float,
+        delimiter=",",
+        quotechar='"',
+        usecols=0,
+        ndmin=1,
+    )
+
+
+def _stem(filename):
+    return os.path.splitext(filename)[0]
+
+
+def _stack_profiles(profiles):
+    """Stack 1-D profiles into 2-D array, with empty profiles as rows of NaN."""
+    M = max((len(p) for p in profiles), default=0)
+    ret = np.full((len(profiles), M), np.nan, dtype=float)
+    for i, p in enumerate(profiles):
+        if len(p) == 0:
+            continue
+        elif len(p) != M:
+            raise ValueError(f"Profiles have different lengths: {len(p)} and {M}.")
+        ret[i] = p
+    return ret
+
+
 class RawProfileBase(abc.ABC):
     """Base class to read raw profile data.
 
@@ -40,6 +89,14 @@ class RawProfileBase(abc.ABC):
     Notes
     -----
     ``self[key]`` returns a tuple of profile(s) and profile name(s).
+    If ``key`` is an integer, a 1-D profile array and its name are returned.
+    If ``key`` is a slice or a sequence of integers, a 2-D array of N profiles and
+    an array of N names are returned.
+
+    :func:`heavyedge.api.prep` loads raw data in batches by :meth:`read_batch`, which
+    indexes the object by a slice or an array of integers. Subclasses are encouraged
+    to implement bulk reading algorithm for these keys in ``__getitem__``. If
+    ``__getitem__`` raises TypeError for them, each profile is read by integer index.
     """
 
     def __init__(self, path):
@@ -55,7 +112,19 @@ class RawProfileBase(abc.ABC):
         return self.count_profiles()
 
     def __getitem__(self, key):
-        """Return profile and name at index.
+        """Return profile(s) and name(s) at index.
+
+        Parameters
+        ----------
+        key : int, slice or sequence of int
+            Index of profile(s).
+
+        Returns
+        -------
+        profile : (M,) or (N, M) ndarray
+            Profile data.
+        name : str or (N,) ndarray of str
+            Profile name(s).
 
         .. note::
             This method will be an abstract method in HeavyEdge 2.0.
@@ -63,6 +132,53 @@ class RawProfileBase(abc.ABC):
         """
         return (self.all_profiles()[key], np.array(self.profile_names())[key])
 
+    def names(self):
+        """Return names of all profiles.
+
+        Returns
+        -------
+        (N,) ndarray of str
+
+        Notes
+        -----
+        Default implementation reads all profiles. Subclasses should override this
+        method if names can be retrieved without reading profiles.
+        """
+        return self.read_batch(slice(None))[1]
+
+    def read_batch(self, key):
+        """Return profiles and names at multiple indices.
+
+        Parameters
+        ----------
+        key : slice or sequence of int
+            Indices of profiles.
+
+        Returns
+        -------
+        profiles : (N, M) ndarray
+            Profile data. Empty profiles are rows of NaN.
+        names : (N,) ndarray of str
+            Profile names.
+
+        Notes
+        -----
+        Default implementation returns ``self[key]``. If it raises TypeError, the
+        object is indexed by each integer index instead, so that subclasses
+        supporting only integer indexing can be read in batches.
+        """
+        try:
+            return self[key]
+        except TypeError:
+            pass
+        idxs = np.arange(len(self))[key]
+        profiles, names = [], []
+        for i in idxs:
+            profile, name = self[int(i)]
+            profiles.append(np.asarray(profile, dtype=float))
+            names.append(name)
+        return (_stack_profiles(profiles), np.array(names, dtype=str))
+
     @_deprecated("1.6", "__len__() method")
     @abc.abstractmethod
     def count_profiles(self):
@@ -136,12 +252,38 @@ class RawProfileCsvs(RawProfileBase):
     ----------
     path : pathlike
         Path to the directory containing the raw CSV files.
+    cache : bool or pathlike, default=False
+        If True, parsed profiles are cached as a binary file in *path*. If path-like,
+        path to the ``.npy`` cache file. See Notes for details.
+    manifest : bool or pathlike, default=False
+        If True, the list of CSV files is persisted as a manifest file in *path*.
+        If path-like, path to the ``.json`` manifest file. See Notes for details.
+
+    Attributes
+    ----------
+    added : list of pathlib.Path
+        CSV files added since the manifest was last written, in sorted order.
+        If *manifest* is not set, all CSV files are regarded as added.
 
     Notes
     -----
     - Each CSV file must contain a single column of numeric values (no header).
     - The order of profiles is determined by the sorted filenames.
     - The profile name is derived from the filename stem.
+    - When indexed by a slice or a sequence, empty CSV files are read as rows of NaN.
+
+    If *cache* is set, all CSV files are parsed into a ``.npy`` matrix, along with
+    a ``.json`` manifest recording name, size and modification time of each file.
+    Next time the same directory is opened, the matrix is memory-mapped instead of
+    parsing the CSV files. If any file is added, removed or modified, the cache is
+    rebuilt. When the cache is used, empty CSV files are read as rows of NaN and
+    indexing by a slice returns a read-only view of the cache.
+
+    If *manifest* is set, the file names are stored with the modification time of
+    the directory. Next time the same directory is opened, the directory is not
+    listed again unless its modification time has changed. When it has changed, the
+    directory is listed again and the manifest is updated, recording which files
+    are newly added.
 
     Examples
     --------
@@ -153,23 +295,162 @@ class RawProfileCsvs(RawProfileBase):
     ...     plt.plot(profile)
     """
 
-    def __init__(self, path):
+    # Directory modification time may have coarse resolution on some file systems.
+    # Listing is reused only if the directory was not modified within this time
+    # before the manifest was written.
+    _MTIME_MARGIN_NS = 2_000_000_000
+
+    def __init__(self, path, cache=False, manifest=False):
         super().__init__(path)
-        self._files = sorted(self.path.glob("*.csv"))
+
+        if manifest is True:
+            manifest_path = self.path / ".heavyedge-manifest.json"
+        elif manifest:
+            manifest_path = Path(manifest).expanduser()
+        else:
+            manifest_path = None
+
+        if manifest_path is None:
+            self._files = self._list_files()
+            self._added = self._files
+        else:
+            self._files, self._added = self._load_manifest(manifest_path)
+
+        if cache is True:
+            self._cache = self._load_cache(self.path / ".heavyedge-cache.npy")
+        elif cache:
+            self._cache = self._load_cache(Path(cache).expanduser())
+        else:
+            self._cache = None
+
+        # Written after the cache, whose files may modify the directory.
+        if manifest_path is not None:
+            self._write_manifest(manifest_path)
 
     def __len__(self):
         return len(self._files)
 
+    @property
+    def added(self):
+        return [self.path / name for name in self._added]
+
+    def _list_files(self):
+        with os.scandir(self.path) as it:
+            names = [
+                entry.name
+                for entry in it
+                if entry.name.endswith(".csv") and entry.is_file()
+            ]
+        return sorted(names)
+
+    def _load_manifest(self, path):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            old_files = manifest["files"]
+            if (
+                manifest["mtime_ns"] == mtime_ns
+                and manifest["written_ns"] - mtime_ns > self._MTIME_MARGIN_NS
+            ):
+                return old_files, []
+        except (OSError, ValueError, KeyError):
+            old_files = []
+        files = self._list_files()
+        old_files = set(old_files)
+        return files, [name for name in files if name not in old_files]
+
+    def _write_manifest(self, path):
+        if not path.exists():
+            # Create the file first, so that writing the content does not modify the
+            # directory afterwards.
+            path.touch()
+        manifest = dict(
+            mtime_ns=os.stat(self.path).st_mtime_ns,
+            written_ns=time.time_ns(),
+            files=self._files,
+        )
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    def _load_cache(self, path):
+        manifest_path = path.with_suffix(".json")
+        files = []
+        for name in self._files:
+            stat = os.stat(os.path.join(self.path, name))
+            files.append([name, stat.st_size, stat.st_mtime_ns])
+        manifest = dict(files=files)
+        try:
+            with open(manifest_path) as f:
+                if json.load(f) == manifest:
+                    return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+
+        # Cache is missing or outdated: parse CSV files and write row by row.
+        tmp_path = path.with_name(path.name + ".tmp")
+        N, arr = len(self._files), None
+        for i, name in enumerate(self._files):
+            profile = self._read_profile(os.path.join(self.path, name))
+            if len(profile) == 0:
+                continue
+            if arr is None:
+                arr = np.lib.format.open_memmap(
+                    tmp_path, mode="w+", dtype=float, shape=(N, len(profile))
+                )
+                arr[:] = np.nan
+            elif len(profile) != arr.shape[1]:
+                raise ValueError(
+                    f"Profiles have different lengths: {len(profile)} and "
+                    f"{arr.shape[1]}."
+                )
+            arr[i] = profile
+        if arr is None:
+            arr = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=float, shape=(N, 0)
+            )
+        arr.flush()
+        del arr
+        os.replace(tmp_path, path)
+
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        return np.load(path, mmap_mode="r")
+
     @staticmethod
     def _read_profile(path):
-        with open(path, newline="") as csvfile:
-            reader = csv.reader(csvfile)
-            profile = np.array([float(row[0]) for row in reader])
-        return profile
+        if os.stat(path).st_size == 0:
+            return np.empty(0, dtype=float)
+        return _read_csv_column(path)
 
     def __getitem__(self, key):
-        file = self._files[key]
-        return (self._read_profile(file), str(file.stem))
+        if isinstance(key, numbers.Integral):
+            name = self._files[key]
+            if self._cache is not None:
+                profile = np.array(self._cache[key])
+            else:
+                profile = self._read_profile(os.path.join(self.path, name))
+            return (profile, _stem(name))
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            if not isinstance(key, slice):
+                key = np.asarray(key)
+            files = [self._files[i] for i in np.arange(len(self))[key]]
+            if self._cache is not None:
+                # Slicing the memory-mapped cache does not copy the data.
+                profiles = self._cache[key]
+            else:
+                profiles = _stack_profiles(
+                    [self._read_profile(os.path.join(self.path, f)) for f in files]
+                )
+            names = np.array([_stem(f) for f in files], dtype=str)
+            return (profiles, names)
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+
+    def names(self):
+        return np.array([_stem(f) for f in self._files], dtype=str)
 
     def count_profiles(self):
         # TODO: remove in HeavyEdge 2.0
@@ -177,10 +458,380 @@ class RawProfileCsvs(RawProfileBase):
 
     def profiles(self):
         # TODO: remove in HeavyEdge 2.0
-        for file in self._files:
-            yield self._read_profile(file)
+        for name in self._files:
+            yield self._read_profile(os.path.join(self.path, name))
 
     def profile_names(self):
         # TODO: remove in HeavyEdge 2.0
-        for f in self._files:
-            yield str(f.stem)
+        for name in self._files:
+            yield _stem(name)
+
+
+class RawProfileWideCsv(RawProfileBase):
+    """Read raw profile data from a CSV file containing multiple profiles.
+
+    File structure:
+
+    .. code-block::
+
+        profile1,profile2,...
+        y11,y21,...
+        y12,y22,...
+        ...
+
+    Parameters
+    ----------
+    path : pathlike
+        Path to the CSV file.
+
+    Notes
+    -----
+    - The first row is a header of profile names.
+    - Each column contains a profile. All columns must have the same length.
+    - The whole file is parsed at once when the object is created.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> import numpy as np
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.io import RawProfileWideCsv
+    >>> Ys, names = RawProfileCsvs(get_sample_path("Type3"))[:]
+    >>> with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+    ...     path = f"{tmpdir}/Type3.csv"
+    ...     np.savetxt(path, Ys.T, delimiter=",", header=",".join(names), comments="")
+    ...     profiles, names = RawProfileWideCsv(path)[:]
+    >>> profiles.shape
+    (35, 3200)
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        with open(self.path, newline="") as csvfile:
+            header = next(csv.reader(csvfile), [])
+            # Parse all columns at once, then make each profile contiguous.
+            profiles = np.loadtxt(
+                csvfile,
+                dtype=float,
+                delimiter=",",
+                quotechar='"',
+                ndmin=2,
+            )
+        self._names = np.array([name.strip() for name in header], dtype=str)
+        if profiles.size == 0:
+            profiles = profiles.reshape(0, len(self._names))
+        self._profiles = np.ascontiguousarray(profiles.T)
+        if len(self._profiles) != len(self._names):
+            raise ValueError(
+                f"Number of names ({len(self._names)}) does not match "
+                f"number of profiles ({len(self._profiles)})."
+            )
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __getitem__(self, key):
+        if isinstance(key, numbers.Integral):
+            return (self._profiles[key].copy(), str(self._names[key]))
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            if not isinstance(key, slice):
+                key = np.asarray(key)
+            return (self._profiles[key].copy(), self._names[key])
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+
+    def names(self):
+        return self._names.copy()
+
+
+class RawProfileArchive(RawProfileBase):
+    """Read raw profile data from an archive of CSV files.
+
+    Archive structure:
+
+    .. code-block::
+
+        rawdata.zip
+        ├── profile1.csv
+        ├── profile2.csv
+        └── ...
+
+    Parameters
+    ----------
+    path : pathlike
+        Path to the zip or tar archive. Compressed tar archive (e.g., ``.tar.gz``)
+        is supported.
+
+    Notes
+    -----
+    - Each CSV file must contain a single column of numeric values (no header).
+    - The order of profiles is determined by the sorted member names.
+    - The profile name is derived from the member name stem.
+    - When indexed by a slice or a sequence, empty CSV files are read as rows of NaN.
+    - Members are read directly from the archive without extraction. Compressed tar
+      archive can only be read forward, so if its members are not stored in sorted
+      order, the archive is decompressed once into a temporary file which is deleted
+      when the archive is closed.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> import zipfile
+    >>> from heavyedge import get_sample_path
+    >>> from heavyedge.io import RawProfileArchive
+    >>> with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+    ...     with zipfile.ZipFile(f"{tmpdir}/Type3.zip", "w") as zf:
+    ...         for file in get_sample_path("Type3").iterdir():
+    ...             zf.write(file, file.name)
+    ...     raw = RawProfileArchive(f"{tmpdir}/Type3.zip")
+    ...     profiles, names = raw[:3]
+    ...     raw.close()
+    >>> profiles.shape
+    (3, 3200)
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        # Archive objects are not thread-safe.
+        self._lock = threading.Lock()
+        if zipfile.is_zipfile(self.path):
+            self._archive = zipfile.ZipFile(self.path)
+            members = {
+                m.filename: m
+                for m in self._archive.infolist()
+                if not m.is_dir() and m.filename.endswith(".csv")
+            }
+        else:
+            self._archive = tarfile.open(self.path, "r:*")
+            members = {
+                m.name: m
+                for m in self._archive.getmembers()
+                if m.isfile() and m.name.endswith(".csv")
+            }
+        self._names = sorted(members.keys())
+        self._members = [members[name] for name in self._names]
+
+        if self._is_compressed_tar() and any(
+            m1.offset_data > m2.offset_data
+            for m1, m2 in zip(self._members, self._members[1:])
+        ):
+            # Seeking backward in a compressed stream decompresses it again from the
+            # start, which makes reading in sorted order quadratic.
+            self._decompress_tar()
+
+    def _is_compressed_tar(self):
+        return isinstance(self._archive, tarfile.TarFile) and isinstance(
+            self._archive.fileobj, (gzip.GzipFile, bz2.BZ2File, lzma.LZMAFile)
+        )
+
+    def _decompress_tar(self):
+        stream = self._archive.fileobj
+        stream.seek(0)
+        file = tempfile.TemporaryFile()
+        shutil.copyfileobj(stream, file)
+        self._archive.close()
+        file.seek(0)
+        # Uncompressed stream has the same offsets, so members are reused.
+        self._archive = tarfile.open(fileobj=file, mode="r:")
+        self._tempfile = file
+
+    def __len__(self):
+        return len(self._members)
+
+    def _read_profile(self, member):
+        with self._lock:
+            if isinstance(self._archive, zipfile.ZipFile):
+                data = self._archive.read(member)
+            else:
+                data = self._archive.extractfile(member).read()
+        if not data.strip():
+            return np.empty(0, dtype=float)
+        return _read_csv_column(io.BytesIO(data))
+
+    def __getitem__(self, key):
+        if isinstance(key, numbers.Integral):
+            profile = self._read_profile(self._members[key])
+            return (profile, PurePosixPath(self._names[key]).stem)
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            if not isinstance(key, slice):
+                key = np.asarray(key)
+            idxs = np.arange(len(self))[key]
+            profiles = _stack_profiles(
+                [self._read_profile(self._members[i]) for i in idxs]
+            )
+            names = np.array(
+                [PurePosixPath(self._names[i]).stem for i in idxs], dtype=str
+            )
+            return (profiles, names)
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+
+    def names(self):
+        return np.array([PurePosixPath(n).stem for n in self._names], dtype=str)
+
+    def close(self):
+        """Close the archive."""
+        self._archive.close()
+        if hasattr(self, "_tempfile"):
+            self._tempfile.close()
+
+
+def _read_rows(dset, key):
+    """Read rows of h5py dataset by a slice or an arbitrary index array."""
+    if isinstance(key, slice):
+        return dset[key]
+    # h5py requires indices to be increasing and unique.
+    uniq, inverse = np.unique(key, return_inverse=True)
+    return dset[uniq][inverse]
+
+
+class RawProfileNpy(RawProfileBase):
+    """Read raw profile data from a NumPy binary file.
+
+    File structure:
+
+    - ``.npy`` file: a 2-D array of N profiles with M points.
+    - ``.npz`` file: a 2-D array ``profiles`` and an optional 1-D array ``names``.
+
+    Parameters
+    ----------
+    path : pathlike
+        Path to the ``.npy`` or ``.npz`` file.
+
+    Notes
+    -----
+    - ``.npy`` file is memory-mapped, so that only the indexed profiles are read.
+      Indexing by a slice returns a read-only view of the file.
+    - ``.npz`` file is loaded into memory as a whole.
+    - If names are not stored, the profile name is its index.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> import numpy as np
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.io import RawProfileNpy
+    >>> Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    >>> with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+    ...     np.save(f"{tmpdir}/Type3.npy", Ys)
+    ...     profile, name = RawProfileNpy(f"{tmpdir}/Type3.npy")[0]
+    >>> name
+    '0'
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        if self.path.suffix == ".npz":
+            with np.load(self.path) as data:
+                self._profiles = data["profiles"]
+                if "names" in data:
+                    self._names = data["names"].astype(str)
+                else:
+                    self._names = None
+        else:
+            self._profiles = np.load(self.path, mmap_mode="r")
+            self._names = None
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __getitem__(self, key):
+        if isinstance(key, numbers.Integral):
+            profile = np.array(self._profiles[key])
+            if self._names is None:
+                name = str(range(len(self))[key])
+            else:
+                name = str(self._names[key])
+            return (profile, name)
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            if not isinstance(key, slice):
+                key = np.asarray(key)
+            profiles = self._profiles[key]
+            if self._names is None:
+                names = np.arange(len(self))[key].astype(str)
+            else:
+                names = self._names[key]
+            return (profiles, names)
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+
+    def names(self):
+        if self._names is None:
+            return np.arange(len(self)).astype(str)
+        return self._names.copy()
+
+
+class RawProfileHdf5(RawProfileBase):
+    """Read raw profile data from a HDF5 file.
+
+    File structure:
+
+    - ``profiles`` dataset: a 2-D array of N profiles with M points.
+    - ``names`` dataset (optional): a 1-D array of N strings.
+
+    Parameters
+    ----------
+    path : pathlike
+        Path to the HDF5 file.
+
+    Notes
+    -----
+    - Only the indexed profiles are read from the file.
+    - If ``names`` dataset does not exist, the profile name is its index.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> import h5py
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.io import RawProfileHdf5
+    >>> Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    >>> with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+    ...     with h5py.File(f"{tmpdir}/Type3.h5", "w") as f:
+    ...         _ = f.create_dataset("profiles", data=Ys)
+    ...     raw = RawProfileHdf5(f"{tmpdir}/Type3.h5")
+    ...     profiles, names = raw[:3]
+    ...     raw.close()
+    >>> profiles.shape
+    (3, 3200)
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = h5py.File(self.path, "r")
+
+    def __len__(self):
+        return len(self._file["profiles"])
+
+    def __getitem__(self, key):
+        profiles = self._file["profiles"]
+        names = self._file.get("names")
+        if isinstance(key, numbers.Integral):
+            profile = profiles[key]
+            if names is None:
+                name = str(range(len(self))[key])
+            else:
+                name = str(names[key], encoding="utf-8")
+            return (profile, name)
+        elif isinstance(key, (slice, Sequence, np.ndarray)):
+            if not isinstance(key, slice):
+                key = np.arange(len(self))[np.asarray(key)]
+            profiles = _read_rows(profiles, key)
+            if names is None:
+                names = np.arange(len(self))[key].astype(str)
+            else:
+                names = _read_rows(names, key)
+                names = np.char.decode(names.astype("S"), encoding="utf-8")
+            return (profiles, names)
+        else:
+            raise TypeError(f"Invalid index type: {type(key)}")
+
+    def names(self):
+        if "names" not in self._file:
+            return np.arange(len(self)).astype(str)
+        names = self._file["names"][:]
+        return np.char.decode(names.astype("S"), encoding="utf-8")
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
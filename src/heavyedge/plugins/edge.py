@@ -31,6 +31,22 @@ class ScaleCommand(Command):
             type=int,
             help="Batch size to load data. If not provided, loads entire profiles.",
         )
+        scale.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead in background thread while the "
+                "current batch is processed. Requires --batch-size."
+            ),
+        )
+        scale.add_argument(
+            "--dtype",
+            choices=["float32", "float64"],
+            help=(
+                "Floating point type of output profiles. "
+                "If not passed, the type of input profiles is used."
+            ),
+        )
         scale.add_argument("-o", "--output", type=pathlib.Path, help="Output file path")
 
     def run(self, args):
@@ -50,13 +66,15 @@ class ScaleCommand(Command):
             _, M = file.shape()
             res = file.resolution()
             name = file.name()
+            dtype = args.dtype or file.dtype()
 
-            with ProfileData(args.output, "w").create(M, res, name) as out:
+            with ProfileData(args.output, "w").create(M, res, name, dtype) as out:
 
                 for scaled, Ls, names in scale(
                     file,
                     args.batch_size,
                     lambda msg: self.logger.info(f"{out.path} : {msg}"),
+                    args.prefetch,
                 ):
                     out.write_profiles(scaled, Ls, names)
 
@@ -89,6 +107,22 @@ class TrimCommand(Command):
             type=int,
             help="Batch size to load data. If not provided, loads entire profiles.",
         )
+        trim.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead in background thread while the "
+                "current batch is processed. Requires --batch-size."
+            ),
+        )
+        trim.add_argument(
+            "--dtype",
+            choices=["float32", "float64"],
+            help=(
+                "Floating point type of output profiles. "
+                "If not passed, the type of input profiles is used."
+            ),
+        )
         trim.add_argument("-o", "--output", type=pathlib.Path, help="Output file path")
 
     def run(self, args):
@@ -101,6 +135,7 @@ class TrimCommand(Command):
             _, M = file.shape()
             res = file.resolution()
             name = file.name()
+            dtype = args.dtype or file.dtype()
 
             Ls = file._file["len"][:]
             if args.width is None:
@@ -108,7 +143,7 @@ class TrimCommand(Command):
 
             w1 = int(args.width * res)
             w2 = (M - Ls).min()
-            with ProfileData(args.output, "w").create(w1 + w2, res, name) as out:
+            with ProfileData(args.output, "w").create(w1 + w2, res, name, dtype) as out:
 
                 for trimmed, Ls, names in trim(
                     file,
@@ -116,6 +151,7 @@ class TrimCommand(Command):
                     w2,
                     args.batch_size,
                     lambda msg: self.logger.info(f"{out.path} : {msg}"),
+                    args.prefetch,
                 ):
                     out.write_profiles(trimmed, Ls, names)
 
@@ -148,6 +184,22 @@ class PadCommand(Command):
             type=int,
             help="Batch size to load data. If not provided, loads entire profiles.",
         )
+        pad.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead in background thread while the "
+                "current batch is processed. Requires --batch-size."
+            ),
+        )
+        pad.add_argument(
+            "--dtype",
+            choices=["float32", "float64"],
+            help=(
+                "Floating point type of output profiles. "
+                "If not passed, the type of input profiles is used."
+            ),
+        )
         pad.add_argument("-o", "--output", type=pathlib.Path, help="Output file path")
 
     def run(self, args):
@@ -160,6 +212,7 @@ class PadCommand(Command):
             _, M = file.shape()
             res = file.resolution()
             name = file.name()
+            dtype = args.dtype or file.dtype()
 
             Ls = file._file["len"][:]
             if args.width is None:
@@ -167,7 +220,7 @@ class PadCommand(Command):
 
             w1 = int(args.width * res)
             w2 = (M - Ls).min()
-            with ProfileData(args.output, "w").create(w1 + w2, res, name) as out:
+            with ProfileData(args.output, "w").create(w1 + w2, res, name, dtype) as out:
 
                 for padded, Ls, names in pad(
                     file,
@@ -175,6 +228,7 @@ class PadCommand(Command):
                     w2,
                     args.batch_size,
                     lambda msg: self.logger.info(f"{out.path} : {msg}"),
+                    args.prefetch,
                 ):
                     out.write_profiles(padded, Ls, names)
 
@@ -38,6 +38,22 @@ class MeanCommand(Command):
             type=int,
             help="Batch size to load data. If not provided, loads entire profiles.",
         )
+        mean.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead in background thread while the "
+                "current batch is processed. Requires --batch-size."
+            ),
+        )
+        mean.add_argument(
+            "--dtype",
+            choices=["float32", "float64"],
+            help=(
+                "Floating point type to load profiles and save the mean profile. "
+                "If not passed, the type of input profiles is used."
+            ),
+        )
         mean.add_argument(
             "-o", "--output", type=pathlib.Path, help="Output npy file path"
         )
@@ -55,13 +71,16 @@ class MeanCommand(Command):
             _, M = file.shape()
             res = file.resolution()
             name = file.name()
+            dtype = args.dtype or file.dtype()
 
-            with ProfileData(args.output, "w").create(M, res, name) as out:
+            with ProfileData(args.output, "w").create(M, res, name, dtype) as out:
                 mean, L = mean_wasserstein(
                     file,
                     args.wnum,
                     args.batch_size,
                     lambda msg: self.logger.info(f"{out.path} : {msg}"),
+                    dtype,
+                    args.prefetch,
                 )
                 mean[L:] = args.fill_value
 
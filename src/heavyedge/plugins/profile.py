@@ -1,5 +1,6 @@
 """Commands to process profiles."""
 
+import inspect
 import pathlib
 from importlib.metadata import entry_points
 
@@ -25,6 +26,22 @@ class PrepCommand(Command):
             help="Type of the raw profile data.",
         )
         prep.add_argument("--name", help="Name to label output dataset.")
+        prep.add_argument(
+            "--cache",
+            action="store_true",
+            help=(
+                "Cache parsed raw data as binary file to speed up next runs. "
+                "Supported by 'csvs' type."
+            ),
+        )
+        prep.add_argument(
+            "--manifest",
+            action="store_true",
+            help=(
+                "Persist the list of raw data files to skip listing the directory "
+                "in next runs if it is not modified. Supported by 'csvs' type."
+            ),
+        )
         prep.add_argument(
             "raw",
             type=pathlib.Path,
@@ -48,6 +65,35 @@ class PrepCommand(Command):
             type=float,
             help="Standard deviation threshold for contact point detection.",
         )
+        prep.add_config_argument(
+            "--sigmas",
+            type=float,
+            nargs="+",
+            help="Values of --sigma to sweep. If not passed, --sigma is used.",
+        )
+        prep.add_config_argument(
+            "--std-thresholds",
+            type=float,
+            nargs="+",
+            help="Values of --std-thres to sweep. If not passed, --std-thres is used.",
+        )
+        prep.add_config_argument(
+            "--filter",
+            choices=["fir", "iir"],
+            help=(
+                "Implementation of Gaussian filter to detect contact point. "
+                "'iir' is faster with large sigma. If not passed, 'fir' is used."
+            ),
+        )
+        prep.add_config_argument(
+            "--coarse",
+            type=int,
+            help=(
+                "Decimation factor to locate contact point candidates on coarse "
+                "profiles first. If not passed, contact point is searched at full "
+                "resolution."
+            ),
+        )
         prep.add_config_argument(
             "--fill-value",
             type=float,
@@ -57,6 +103,14 @@ class PrepCommand(Command):
                 "'nan' can be passed."
             ),
         )
+        prep.add_config_argument(
+            "--decimate",
+            type=int,
+            help=(
+                "Decimation factor of preprocessed profiles. Resolution of the output "
+                "is divided by this factor. If not passed, profiles are not decimated."
+            ),
+        )
         prep.add_config_argument(
             "--z-thres",
             type=float,
@@ -65,11 +119,109 @@ class PrepCommand(Command):
                 "If not passed, outliers are not detected."
             ),
         )
+        prep.add_config_argument(
+            "--z-window",
+            type=int,
+            help=(
+                "Number of recent profiles to detect outliers with. If passed, "
+                "outliers are rejected as profiles arrive. If not passed, outliers "
+                "are detected among all profiles."
+            ),
+        )
+        prep.add_argument(
+            "--spill-dir",
+            type=pathlib.Path,
+            help=(
+                "Directory to keep preprocessed profiles temporarily for outlier "
+                "detection without --z-window. If not passed, the directory of the "
+                "output file is used."
+            ),
+        )
         prep.add_config_argument(
             "--batch-size",
             type=int,
             help="Batch size to load data. If not provided, load entire profiles.",
         )
+        prep.add_argument(
+            "--readers",
+            type=int,
+            help="Number of threads to read raw data in background.",
+        )
+        prep.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead. "
+                "If not passed, equals to the number of readers."
+            ),
+        )
+        prep.add_argument(
+            "--workers",
+            type=int,
+            help=(
+                "Number of processes to preprocess profiles. "
+                "If not passed, profiles are preprocessed in the main process."
+            ),
+        )
+        prep.add_argument(
+            "--append",
+            action="store_true",
+            help=(
+                "Append profiles to existing output file, skipping raw profiles whose "
+                "names are already in it or were rejected before. Outliers are "
+                "detected among the existing profiles together with the new ones, "
+                "whose areas are stored in the output file. "
+                "Cannot be used with --contiguous, or with contiguous output file."
+            ),
+        )
+        prep.add_argument(
+            "--dtype",
+            choices=["float32", "float64"],
+            help=(
+                "Floating point type to preprocess and save profiles. "
+                "If not passed, float64 is used, or the type of the existing output "
+                "file with --append."
+            ),
+        )
+        prep.add_argument(
+            "--compression",
+            choices=["gzip", "lzf"],
+            help="Compression filter of output profiles.",
+        )
+        prep.add_argument(
+            "--shuffle",
+            action="store_true",
+            help="Apply byte shuffle filter before compression.",
+        )
+        prep.add_argument(
+            "--contiguous",
+            action="store_true",
+            help=(
+                "Store profiles contiguously without chunking, so that they can be "
+                "memory-mapped. The output cannot grow after it is written, and its "
+                "space is allocated for all raw profiles: rows of invalid or outlier "
+                "profiles are not read as profiles but stay allocated in the file. "
+                "Cannot be used with --compression or --append."
+            ),
+        )
+        prep.add_argument(
+            "--ragged",
+            action="store_true",
+            help=(
+                "Store only the values before the contact points, padding profiles "
+                "with --fill-value (nan if not passed) when they are read."
+            ),
+        )
+        prep.add_argument(
+            "--sweep",
+            action="store_true",
+            help=(
+                "Detect contact points for every pair of --sigmas and --std-thresholds "
+                "values, "
+                "and save the lengths of profiles as csv file instead of hdf5 file. "
+                "Outlier detection, filling and appending are not performed."
+            ),
+        )
         prep.add_argument("-o", "--output", type=pathlib.Path, help="Output file path")
 
     def run(self, args):
@@ -78,29 +230,189 @@ class PrepCommand(Command):
 
         self.logger.info(f"Writing {args.output}")
 
+        if args.contiguous and args.append:
+            raise ValueError("--contiguous cannot be used with --append.")
+        if args.contiguous and (args.compression is not None or args.shuffle):
+            raise ValueError("--contiguous cannot be used with --compression.")
+
         raw_type = entry_points(group="heavyedge.rawdata")[args.type].load()
-        raw = raw_type(args.raw)
+        raw_kwargs = dict()
+        for key in ["cache", "manifest"]:
+            if not getattr(args, key):
+                continue
+            if key not in inspect.signature(raw_type).parameters:
+                raise ValueError(f"--{key} is not supported by '{args.type}' type.")
+            raw_kwargs[key] = True
+        raw = raw_type(args.raw, **raw_kwargs)
+
+        if args.sweep:
+            sigmas = args.sigma if args.sigmas is None else args.sigmas
+            std_thresholds = (
+                args.std_thres if args.std_thresholds is None else args.std_thresholds
+            )
+            # Config file may give either a scalar or a list.
+            sigmas = np.atleast_1d(sigmas).astype(float)
+            std_thresholds = np.atleast_1d(std_thresholds).astype(float)
+            self.sweep(raw, sigmas, std_thresholds, args)
+            return
+        if args.sigmas is not None or args.std_thresholds is not None:
+            raise ValueError("--sigmas and --std-thresholds require --sweep.")
+        sigma, std_thres = args.sigma, args.std_thres
+
+        dtype = args.dtype or np.float64
+        reference = None
+        if args.append and args.output.exists():
+            with ProfileData(args.output) as out:
+                if not out.is_ragged() and out._file["profiles"].chunks is None:
+                    raise ValueError(
+                        f"Cannot append to contiguous profiles in {args.output}."
+                    )
+                # Raw profiles which were rejected are not read again.
+                exclude = np.concatenate(
+                    [
+                        out._file[key][:].astype("S")
+                        for key in ["names", "rejected"]
+                        if key in out._file
+                    ]
+                )
+                dtype = args.dtype or out.dtype()
+                if args.z_thres is not None:
+                    reference = self.areas(out, args.batch_size, args.decimate)
+            exclude = np.char.decode(exclude, encoding="utf-8")
+            self.logger.info(f"Skipping {len(exclude)} profiles in {args.output}")
+        else:
+            exclude = None
 
         gen = prep(
             raw,
-            args.sigma,
-            args.std_thres,
+            sigma,
+            std_thres,
             args.fill_value,
             args.z_thres,
             args.batch_size,
             lambda msg: self.logger.info(f"{args.output} : {msg}"),
+            args.readers,
+            args.prefetch,
+            exclude,
+            args.workers,
+            args.filter or "fir",
+            args.coarse,
+            dtype,
+            args.z_window,
+            args.decimate,
+            reference,
+            return_areas=True,
+            spill_dir=args.spill_dir or args.output.parent,
         )
-
-        # Get first result to determine M
-        Ys, Ls, names = next(gen)
-        M = len(Ys[0])
-        with ProfileData(args.output, "w").create(M, args.res, args.name) as out:
-            out.write_profiles(Ys, Ls, names)
-            for Ys, Ls, names in gen:
-                out.write_profiles(Ys, Ls, names)
+        accepted = []
+
+        if exclude is not None:
+            with ProfileData(args.output, "r+") as out:
+                _, M = out.shape()
+                for Ys, Ls, names, areas in gen:
+                    if Ys.shape[1] != M:
+                        raise ValueError(
+                            f"Profile length {Ys.shape[1]} does not match "
+                            f"{args.output} ({M})."
+                        )
+                    self.write_profiles(out, Ys, Ls, names, areas)
+                    accepted.append(names)
+                self.write_rejected(out, raw.names(), exclude, accepted)
+        else:
+            # Get first result to determine M
+            Ys, Ls, names, areas = next(gen)
+            _, M = Ys.shape
+            res = args.res / (args.decimate or 1)
+            with ProfileData(args.output, "w").create(
+                M,
+                res,
+                args.name,
+                dtype,
+                chunks=False if args.contiguous else None,
+                compression=args.compression,
+                shuffle=args.shuffle,
+                capacity=len(raw),
+                ragged=args.ragged,
+                fill_value=np.nan if args.fill_value is None else args.fill_value,
+            ) as out:
+                self.write_profiles(out, Ys, Ls, names, areas)
+                accepted.append(names)
+                for Ys, Ls, names, areas in gen:
+                    self.write_profiles(out, Ys, Ls, names, areas)
+                    accepted.append(names)
+                self.write_rejected(out, raw.names(), [], accepted)
 
         self.logger.info(f"Saved {out.path}")
 
+    def sweep(self, raw, sigmas, std_thresholds, args):
+        import csv
+
+        from heavyedge.api import prep_sweep
+
+        gen = prep_sweep(
+            raw,
+            sigmas,
+            std_thresholds,
+            args.filter or "fir",
+            args.batch_size,
+            lambda msg: self.logger.info(f"{args.output} : {msg}"),
+            args.readers,
+            args.prefetch,
+        )
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "sigma", "std_thres", "length"])
+            for Ls, names in gen:
+                for name, L in zip(names, Ls):
+                    for (i, j), length in np.ndenumerate(L):
+                        writer.writerow(
+                            [name, sigmas[i], std_thresholds[j], int(length)]
+                        )
+        self.logger.info(f"Saved {args.output}")
+
+    @staticmethod
+    def write_profiles(out, Ys, Ls, names, areas):
+        # Areas compared to detect outliers are stored to be the reference of the
+        # next appending. They are written first, so that they are not shorter
+        # than the profiles if the writing is interrupted.
+        start = len(out)
+        if "area" not in out._file:
+            out._file.create_dataset("area", (0,), maxshape=(None,), dtype=float)
+        out._file["area"].resize(start + len(areas), axis=0)
+        out._file["area"][start:] = areas
+        out.write_profiles(Ys, Ls, names)
+
+    @staticmethod
+    def write_rejected(out, raw_names, exclude, accepted):
+        # Names of raw profiles rejected as invalid or outlier.
+        import h5py
+
+        processed = np.concatenate([np.asarray(exclude, dtype=str), *accepted])
+        rejected = np.setdiff1d(raw_names, processed)
+        if "rejected" not in out._file:
+            out._file.create_dataset(
+                "rejected", (0,), maxshape=(None,), dtype=h5py.string_dtype()
+            )
+        dataset = out._file["rejected"]
+        start = len(dataset)
+        dataset.resize(start + len(rejected), axis=0)
+        dataset[start:] = rejected
+
+    @staticmethod
+    def areas(data, batch_size=None, decimate=None):
+        # Areas of the stored profiles, compared to detect outliers.
+        if "area" in data._file:
+            return data._file["area"][: len(data)]
+        # File written without the areas. Decimated profiles are compared as if
+        # they were at the resolution of raw profiles.
+        from heavyedge.profile import fill_after
+
+        sums = [np.empty(0)]
+        for Ys, Ls, _ in data.iter_batches(batch_size):
+            fill_after(Ys, Ls, 0)
+            sums.append(np.sum(Ys, axis=1, dtype=np.float64))
+        return np.concatenate(sums) * (decimate or 1)
+
     @staticmethod
     def is_invalid(profile):
         return (len(profile) == 0) or np.any(np.isnan(profile))
@@ -139,6 +451,7 @@ class OutlierCommand(Command):
             _, M = data.shape()
             res = data.resolution()
             name = data.name()
+            dtype = data.dtype()
 
             x = data.x()
             areas = []
@@ -147,15 +460,12 @@ class OutlierCommand(Command):
                 areas.append(np.trapezoid(Y[:L], x[:L]))
             is_outlier = outlier(np.array(areas), args.z)
 
-            with ProfileData(args.output, "w").create(M, res, name) as out:
-                for skip, Y, L, name in zip(
-                    is_outlier,
-                    data._file["profiles"],
-                    data._file["len"],
-                    data.profile_names(),
-                ):
-                    if not skip:
-                        out.write_profiles(Y.reshape(1, -1), [L], [name])
+            with ProfileData(args.output, "w").create(
+                M, res, name, dtype, capacity=len(data)
+            ) as out:
+                for i in np.flatnonzero(~is_outlier):
+                    Y, L, name = data[int(i)]
+                    out.write_profiles(Y.reshape(1, -1), [L], [name])
 
         self.logger.info(f"Saved {out.path}")
 
@@ -186,6 +496,14 @@ class FillCommand(Command):
             type=int,
             help="Batch size to load data. If not passed, all data are loaded at once.",
         )
+        fill.add_argument(
+            "--prefetch",
+            type=int,
+            help=(
+                "Number of batches to read ahead in background thread while the "
+                "current batch is processed. Requires --batch-size."
+            ),
+        )
         fill.add_argument("-o", "--output", type=pathlib.Path, help="Output file path")
 
     def run(self, args):
@@ -199,14 +517,18 @@ class FillCommand(Command):
 
         with ProfileData(args.profiles) as file:
             (_, M), res, name = file.shape(), file.resolution(), file.name()
+            dtype = file.dtype()
             gen = fill(
                 file,
                 args.fill_value,
                 args.batch_size,
                 lambda msg: self.logger.info(f"{args.output} : {msg}"),
+                args.prefetch,
             )
 
-            with ProfileData(args.output, "w").create(M, res, name) as out:
+            with ProfileData(args.output, "w").create(
+                M, res, name, dtype, capacity=len(file)
+            ) as out:
                 for Ys, Ls, names in gen:
                     out.write_profiles(Ys, Ls, names)
 
@@ -243,8 +565,9 @@ class MergeCommand(Command):
         with ProfileData(args.profiles[0]) as data:
             _, M = data.shape()
             res = data.resolution()
+            dtype = data.dtype()
 
-        with ProfileData(args.output, "w").create(M, res, args.name) as out:
+        with ProfileData(args.output, "w").create(M, res, args.name, dtype) as out:
             for p in args.profiles:
                 with ProfileData(p) as data:
                     if args.batch_size is not None:
@@ -302,8 +625,11 @@ class FilterCommand(Command):
         with ProfileData(args.profiles) as data:
             _, M = data.shape()
             res = data.resolution()
+            dtype = data.dtype()
 
-            with ProfileData(args.output, "w").create(M, res, args.name) as out:
+            with ProfileData(args.output, "w").create(
+                M, res, args.name, dtype, capacity=N
+            ) as out:
                 if args.batch_size is not None:
                     for i in range(0, N, args.batch_size):
                         idxs = index[i : i + args.batch_size]
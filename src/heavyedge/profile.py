@@ -2,17 +2,24 @@
 
 __all__ = [
     "preprocess",
+    "preprocess_sweep",
+    "Preprocessor",
+    "decimate",
     "fill_after",
 ]
 
 
 import numpy as np
-from scipy.ndimage import gaussian_filter1d
-from scipy.signal import find_peaks
-from scipy.stats import linregress
+from scipy.ndimage import (
+    correlate1d,
+    gaussian_filter1d,
+    maximum_filter1d,
+    minimum_filter1d,
+)
+from scipy.signal import lfilter, lfilter_zi
 
 
-def preprocess(Ys, sigma, std_thres):
+def preprocess(Ys, sigma, std_thres, filter="fir", coarse=None):
     """Preprocess raw profiles.
 
     Parameters
@@ -23,6 +30,18 @@ def preprocess(Ys, sigma, std_thres):
         Standard deviation of Gaussian filter for smoothing.
     std_thres : scalar
         Standard deviation threshold to detect contact point.
+    filter : {'fir', 'iir'}
+        Implementation of the second derivative of Gaussian filter.
+        'fir' convolves the truncated Gaussian kernel, whose cost grows with
+        *sigma*. 'iir' applies a recursive approximation whose cost does not
+        depend on *sigma*.
+    coarse : int, optional
+        Decimation factor for coarse-to-fine detection of contact point.
+        If passed, candidate contact points are located on the profiles averaged over
+        every *coarse* points with Gaussian filter of ``sigma / coarse``, and then
+        refined at full resolution only around them. Full resolution is searched
+        instead if ``sigma / coarse`` is less than 1, or with 'iir' filter.
+        If not passed, contact point is searched at full resolution.
 
     Returns
     -------
@@ -38,60 +57,576 @@ def preprocess(Ys, sigma, std_thres):
     1. Profile direction is set so that the contact point is on the right hand side.
     2. Contact point is detected, and set to have zero height.
 
+    Profiles are processed in blocks of rows, so that the memory for the temporary
+    arrays is bounded regardless of the number of profiles.
+
+    The recursive filter follows Deriche's fourth-order approximation [1]_. It can
+    detect different contact points from the 'fir' filter when the second derivative
+    has multiple peaks of similar heights, e.g., with small *sigma*. Likewise,
+    coarse-to-fine detection can miss the contact point found at full resolution if
+    the coarse profile has no peak near it.
+
+    References
+    ----------
+    .. [1] Deriche, R. (1993). Recursively implementing the Gaussian and its
+       derivatives. INRIA Research Report 1893.
+
     Examples
     --------
-    >>> import numpy as np
     >>> from heavyedge import get_sample_path, RawProfileCsvs
     >>> from heavyedge.profile import preprocess
-    >>> raw = RawProfileCsvs(get_sample_path("Type3"))
-    >>> Ys = np.array([raw[i][0] for i in range(len(raw))])
+    >>> Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
     >>> Ys_processed, Ls = preprocess(Ys, 32, 0.01)
     >>> import matplotlib.pyplot as plt  # doctest: +SKIP
     ... for Y, L in zip(Ys_processed, Ls):
     ...     plt.plot(Y[:L])
     """
-    ret_Ys, ret_Ls = [], []
-    for Y in Ys:
-        Y_proc, L = _preprocess(Y, sigma, std_thres)
-        ret_Ys.append(Y_proc)
-        ret_Ls.append(L)
-    return np.array(ret_Ys), np.array(ret_Ls)
-
-
-def _preprocess(Y, sigma, std_thres):
-    if Y[0] < Y[-1]:
-        # Make plateau is on the left and cp is on the right
-        Y = np.flip(Y)
-
-    X = np.arange(len(Y))
-    h_xx = gaussian_filter1d(Y, sigma, order=2, mode="nearest")
-    if len(h_xx) > 0:
-        peaks, _ = find_peaks(h_xx)
-    else:
-        peaks = np.empty(0, dtype=int)
-
-    candidates = []
-    for i, peak_idx in enumerate(peaks):
-        x = X[peak_idx:]
-        if not len(x) > 2:
-            continue
-        y = Y[x]
-        reg = linregress(x, y)
-        residuals = y - (reg.intercept + reg.slope * x)
-        std = np.sqrt(np.sum(residuals**2) / (len(x) - 2))
-        if std < std_thres:
-            candidates.append(i)
-
-    if candidates:
-        cp = peaks[candidates[np.argmax(h_xx[peaks[candidates]])]]
+    Ys = np.asarray(Ys)
+    if not np.issubdtype(Ys.dtype, np.floating):
+        Ys = Ys.astype(float)
+    N, M = Ys.shape
+    if coarse is not None and coarse < 1:
+        raise ValueError(f"Decimation factor must be positive: {coarse}")
+    if N == 0 or M == 0:
+        return Ys.copy(), np.full(N, M, dtype=int)
+
+    Ys_processed = np.empty(Ys.shape, dtype=Ys.dtype)
+    Ls = np.empty(N, dtype=int)
+    for rows in _row_blocks(N, M):
+        Ys_processed[rows], Ls[rows] = _preprocess(
+            Ys[rows], sigma, std_thres, filter, coarse
+        )
+    return Ys_processed, Ls
+
+
+def _row_blocks(N, M):
+    # Temporary arrays of contact point detection are several times larger than the
+    # profiles, so that profiles are processed in blocks of rows to bound the memory.
+    step = max(_BLOCK_VALUES // M, 1)
+    return [slice(i, i + step) for i in range(0, N, step)]
+
+
+# Number of values in a block of rows processed at once.
+_BLOCK_VALUES = 2**16
+
+
+def _preprocess(Ys, sigma, std_thres, filter, coarse):
+    N, M = Ys.shape
+    Ys = _orient(Ys)
+    tail_std = _tail_std(Ys)
+    if coarse is None:
+        cp, found = _best_peak(_gaussian_d2(Ys, sigma, filter), tail_std, std_thres)
     else:
-        cp = len(Y) - 1
+        cp, found = _coarse_to_fine(Ys, tail_std, sigma, std_thres, filter, int(coarse))
+    cp[~found] = M - 1
+    cp = _lowest_before(Ys, cp)
+    Ys = Ys - Ys[np.arange(N), cp][:, np.newaxis]
+    return Ys, cp + 1
+
+
+def preprocess_sweep(Ys, sigmas, std_thresholds, filter="fir"):
+    """Detect contact points of raw profiles for every pair of parameters.
+
+    Equivalent to calling :func:`preprocess` for each pair of *sigmas* and
+    *std_thresholds*, but each profile is oriented once and filtered once per sigma.
+
+    Parameters
+    ----------
+    Ys : (N, M) array
+        Array of N profiles.
+    sigmas : (S,) array-like
+        Standard deviations of Gaussian filter for smoothing.
+    std_thresholds : (T,) array-like
+        Standard deviation thresholds to detect contact point.
+    filter : {'fir', 'iir'}
+        Implementation of the second derivative of Gaussian filter.
+
+    Returns
+    -------
+    Ls : (N, S, T) array
+        Length of each profile until the contact point, for each sigma and
+        standard deviation threshold.
+
+    Examples
+    --------
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.profile import preprocess_sweep
+    >>> Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    >>> Ls = preprocess_sweep(Ys, [16, 32], [0.01, 0.1])
+    >>> Ls.shape
+    (35, 2, 2)
+    """
+    sigmas = np.atleast_1d(sigmas)
+    std_thresholds = np.atleast_1d(std_thresholds)
+    Ys = np.asarray(Ys)
+    if not np.issubdtype(Ys.dtype, np.floating):
+        Ys = Ys.astype(float)
+    N, M = Ys.shape
+    Ls = np.full((N, len(sigmas), len(std_thresholds)), M, dtype=int)
+    if N == 0 or M == 0:
+        return Ls
+
+    for rows in _row_blocks(N, M):
+        Y = _orient(Ys[rows])
+        tail_std = _tail_std(Y)
+        for i, sigma in enumerate(sigmas):
+            h_xx = _gaussian_d2(Y, sigma, filter)
+            peaks = _find_peaks(h_xx)
+            for j, std_thres in enumerate(std_thresholds):
+                cp, found = _best_peak(h_xx, tail_std, std_thres, peaks)
+                cp[~found] = M - 1
+                Ls[rows, i, j] = _lowest_before(Y, cp) + 1
+    return Ls
+
+
+class Preprocessor:
+    """Preprocessor of raw profiles with fixed length.
 
+    Equivalent to :func:`preprocess`, but the filter kernel and the terms of contact
+    point detection which depend only on the profile length are prepared once.
+    Scratch buffers for the oriented profiles, the regression sums, the filtered
+    profiles and the peak scores are allocated for the number of profiles and
+    reused while it does not change. Suitable for preprocessing profiles one by one
+    as they are measured.
+
+    Peak detection and the 'iir' filter still allocate temporary arrays, and the
+    returned profiles are newly allocated.
+
+    Because the buffers are shared, an instance must not be called from multiple
+    threads at once. Use one instance per thread instead.
+
+    Parameters
+    ----------
+    M : int
+        Length of profiles.
+    sigma : scalar
+        Standard deviation of Gaussian filter for smoothing.
+    std_thres : scalar
+        Standard deviation threshold to detect contact point.
+    filter : {'fir', 'iir'}
+        Implementation of the second derivative of Gaussian filter.
+
+    Examples
+    --------
+    >>> from heavyedge import get_sample_path, RawProfileCsvs
+    >>> from heavyedge.profile import Preprocessor
+    >>> raw = RawProfileCsvs(get_sample_path("Type3"))
+    >>> Y, _ = raw[0]
+    >>> preprocessor = Preprocessor(len(Y), 32, 0.01)
+    >>> Y_processed, L = preprocessor(Y)
+    >>> import matplotlib.pyplot as plt  # doctest: +SKIP
+    ... plt.plot(Y_processed[:L])
+    """
+
+    def __init__(self, M, sigma, std_thres, filter="fir"):
+        self.M = M
+        self.sigma = sigma
+        self.std_thres = std_thres
+        self.filter = filter
+        if filter == "fir":
+            # Kernel of gaussian_filter1d, so that results are identical.
+            radius = int(4.0 * float(sigma) + 0.5)
+            impulse = np.zeros(2 * radius + 1)
+            impulse[radius] = 1
+            h = gaussian_filter1d(impulse, sigma, order=2, mode="constant")
+            self._weights = h[::-1].copy()
+        elif filter == "iir":
+            b_causal, b_anti, a = _deriche_d2_coefs(sigma)
+            self._iir_coefs = (b_causal, b_anti, a)
+        else:
+            raise ValueError(f"Unknown filter: {filter}")
+        self._x_sums = _tail_x_sums(M)
+        self._buffers = dict()
+
+    def __call__(self, Ys):
+        """Preprocess raw profiles.
+
+        Parameters
+        ----------
+        Ys : (M,) or (N, M) array
+            A profile or array of N profiles.
+
+        Returns
+        -------
+        Ys : (M,) or (N, M) array
+            Preprocessed profile data.
+        Ls : int or (N,) array
+            Length of *Y* until the contact point.
+        """
+        Ys = np.asarray(Ys)
+        if not np.issubdtype(Ys.dtype, np.floating):
+            Ys = Ys.astype(float)
+        single = Ys.ndim == 1
+        Ys = np.atleast_2d(Ys)
+        N, M = Ys.shape
+        if M != self.M:
+            raise ValueError(f"Profile length {M} does not match {self.M}.")
+
+        if N == 0 or M == 0:
+            Ys, Ls = Ys.copy(), np.full(N, M, dtype=int)
+        else:
+            Ys = _orient(Ys, self._buffer("Ys", (N, M), Ys.dtype))
+            work = self._buffer("work", (6, N, M), np.float64)
+            tail_std = _tail_std(Ys, self._x_sums, work)
+            score = self._buffer("score", (N, M), np.float64)
+            cp, found = _best_peak(
+                self._gaussian_d2(Ys), tail_std, self.std_thres, score=score
+            )
+            cp[~found] = M - 1
+            cp = _lowest_before(
+                Ys,
+                cp,
+                self._buffer("lowest", (N, M), Ys.dtype),
+                self._buffer("mask", (N, M), bool),
+            )
+            Ys = Ys - Ys[np.arange(N), cp][:, np.newaxis]
+            Ls = cp + 1
+        if single:
+            return Ys[0], Ls[0]
+        return Ys, Ls
+
+    def _buffer(self, name, shape, dtype):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _gaussian_d2(self, Ys):
+        if self.filter == "iir":
+            return _recursive_gaussian_d2(Ys, self.sigma, self._iir_coefs)
+        h_xx = self._buffer("h_xx", Ys.shape, Ys.dtype)
+        correlate1d(Ys, self._weights, axis=1, output=h_xx, mode="nearest")
+        return h_xx
+
+
+def _orient(Ys, out=None):
+    # Make plateau is on the left and cp is on the right
+    flip = Ys[:, 0] < Ys[:, -1]
+    if out is None:
+        return np.where(flip[:, np.newaxis], Ys[:, ::-1], Ys)
+    np.copyto(out, Ys)
+    np.copyto(out, Ys[:, ::-1], where=flip[:, np.newaxis])
+    return out
+
+
+def _lowest_before(Ys, cp, out=None, mask=None):
     # If any point before cp is lower than the detected contact point,
     # set that as contact point instead.
-    cp = np.argmin(Y[: cp + 1])
-    Y = Y - Y[cp]
-    return Y, cp + 1
+    X = np.arange(Ys.shape[1])
+    if out is None:
+        return np.argmin(
+            np.where(X[np.newaxis, :] <= cp[:, np.newaxis], Ys, np.inf), axis=1
+        )
+    mask = np.greater(X[np.newaxis, :], cp[:, np.newaxis], out=mask)
+    np.copyto(out, Ys)
+    np.copyto(out, np.inf, where=mask)
+    return np.argmin(out, axis=1)
+
+
+def _gaussian_d2(Ys, sigma, filter):
+    if filter == "fir":
+        return gaussian_filter1d(Ys, sigma, axis=1, order=2, mode="nearest")
+    elif filter == "iir":
+        return _recursive_gaussian_d2(Ys, sigma)
+    raise ValueError(f"Unknown filter: {filter}")
+
+
+def _best_peak(h_xx, tail_std, std_thres, peaks=None, score=None):
+    """Index of the contact point candidate in each row.
+
+    Candidate is the peak of *h_xx* with *tail_std* lower than *std_thres*, having
+    the largest *h_xx*; the first one if tied. Returns the indices and whether each
+    row has any candidate. *peaks* is the result of :func:`_find_peaks` on *h_xx*,
+    computed if not passed. *score* is (N, M) float64 buffer, allocated if not
+    passed.
+    """
+    N, M = h_xx.shape
+    if peaks is None:
+        peaks = _find_peaks(h_xx)
+    rows, peaks = peaks
+    is_candidate = tail_std[rows, peaks] < std_thres
+    if score is None:
+        score = np.empty((N, M))
+    score.fill(-np.inf)
+    rows, peaks = rows[is_candidate], peaks[is_candidate]
+    score[rows, peaks] = h_xx[rows, peaks]
+    found = np.zeros(N, dtype=bool)
+    found[rows] = np.isfinite(score[rows, peaks])
+    return np.argmax(score, axis=1), found
+
+
+def _coarse_to_fine(Ys, tail_std, sigma, std_thres, filter, q):
+    """Locate contact point candidates on decimated profiles and refine them.
+
+    Returns the same as :func:`_best_peak`. Every peak of the coarse profile which
+    can pass *std_thres* is refined at full resolution, and the best of the refined
+    peaks is chosen. Rows without any refined candidate are searched at full
+    resolution, and so is the whole array if the coarse filter is too narrow to
+    resolve the peaks or if the refinement is not cheaper. Recursive filter is not
+    local, so 'iir' is always applied at full resolution.
+    """
+    N, M = Ys.shape
+    # Coarse peak is refined within r points, which covers the localization error of
+    # block averaging and of the filter, which grows with sigma on noisy profiles.
+    r = 2 * q + int(np.ceil(sigma))
+    if filter == "iir" or q == 1 or sigma / q < _COARSE_MIN_SIGMA:
+        return _best_peak(_gaussian_d2(Ys, sigma, filter), tail_std, std_thres)
+
+    # Average every q points, with the last block padded by the edge value.
+    Mc = -(-M // q)
+    Yc = np.pad(Ys, ((0, 0), (0, Mc * q - M)), mode="edge")
+    Yc = Yc.reshape(N, Mc, q).mean(axis=2)
+    # Coarse point represents the center of its block. It is a candidate if any
+    # point within its refinement range passes the threshold.
+    center = np.minimum(np.arange(Mc) * q + q // 2, M - 1)
+    min_std = minimum_filter1d(tail_std, 2 * r + 1, axis=1, mode="nearest")
+    rows, peaks = _find_peaks(_gaussian_d2(Yc, sigma / q, filter))
+    # Peak close to the ends may not be resolved by the coarse profile.
+    rows = np.concatenate([rows, np.repeat(np.arange(N), 2)])
+    peaks = np.concatenate([peaks, np.tile([0, Mc - 1], N)])
+    is_candidate = min_std[rows, center[peaks]] < std_thres
+    rows, cand = rows[is_candidate], center[peaks[is_candidate]]
+
+    # Runs of points to refine in each row, where overlapping ranges are merged.
+    search = np.zeros((N, M + 2), dtype=bool)
+    search[rows, cand + 1] = True
+    search = maximum_filter1d(search, 2 * r + 1, axis=1, mode="constant")
+    search[:, [0, -1]] = False
+    run_rows, run_starts = np.nonzero(~search[:, :-1] & search[:, 1:])
+    _, run_stops = np.nonzero(search[:, :-1] & ~search[:, 1:])
+    # Each run is extended by the kernel radius on both sides, so that h_xx in the
+    # run equals the full resolution one. Runs are concatenated into a single row.
+    pad = int(4 * sigma + 0.5) + 1
+    lengths = run_stops - run_starts + 2 * pad
+    if np.sum(lengths) >= N * M:
+        return _best_peak(_gaussian_d2(Ys, sigma, filter), tail_std, std_thres)
+    offsets = np.cumsum(lengths) - lengths
+    seg_rows = np.repeat(run_rows, lengths)
+    local = np.arange(np.sum(lengths)) - np.repeat(offsets, lengths)
+    seg_cols = local + np.repeat(run_starts - pad, lengths)
+    in_run = (local >= pad) & (local < np.repeat(lengths, lengths) - pad)
+    Ypad = np.pad(Ys, ((0, 0), (pad, pad)), mode="edge")
+    h_xx = _gaussian_d2(Ypad[seg_rows, seg_cols + pad][np.newaxis], sigma, filter)[0]
+
+    _, pos = _find_peaks(h_xx[np.newaxis])
+    pos = pos[in_run[pos]]
+    rows, cols = seg_rows[pos], seg_cols[pos]
+    is_candidate = tail_std[rows, cols] < std_thres
+    rows, cols, pos = rows[is_candidate], cols[is_candidate], pos[is_candidate]
+
+    # Best refined peak of each row; the first one if tied, as in _best_peak.
+    order = np.lexsort((cols, -h_xx[pos], rows))
+    rows, cols = rows[order], cols[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    cp = np.zeros(N, dtype=int)
+    found = np.zeros(N, dtype=bool)
+    cp[rows[first]] = cols[first]
+    found[rows[first]] = True
+
+    if not np.all(found):
+        (rest,) = np.nonzero(~found)
+        cp[rest], found[rest] = _best_peak(
+            _gaussian_d2(Ys[rest], sigma, filter), tail_std[rest], std_thres
+        )
+    return cp, found
+
+
+# Minimum sigma of the coarse filter, in coarse points, to resolve the peaks.
+_COARSE_MIN_SIGMA = 1.0
+
+
+# Deriche's coefficients as (w, l) of the poles and (a, b) of the numerators,
+# approximating the causal half of the Gaussian and its second derivative by
+# sum((a * cos(w * x) + b * sin(w * x)) * exp(l * x)) for x >= 0 in units of sigma.
+_DERICHE_POLES = ((0.6681, -1.3932), (2.0787, -1.3732))
+_DERICHE_GAUSS = ((1.3530, 1.8151), (-0.3531, 0.0902))
+_DERICHE_D2 = ((-1.3563, 5.2318), (0.3446, -2.2355))
+
+
+def _recursive_gaussian_d2(Ys, sigma, coefs=None):
+    """Second derivative of Gaussian filter by recursive filtering along axis 1.
+
+    The kernel is split into causal and anti-causal parts, each applied by a fourth
+    order recursion. Boundary is extended by the nearest values. *coefs* is the
+    result of :func:`_deriche_d2_coefs`, computed if not passed.
+    """
+    if coefs is None:
+        coefs = _deriche_d2_coefs(sigma)
+    b_causal, b_anti, a = coefs
+    # Steady state for the constant extension of the boundary values.
+    Y_causal, _ = lfilter(
+        b_causal, a, Ys, axis=1, zi=lfilter_zi(b_causal, a) * Ys[:, :1]
+    )
+    Ys_rev = Ys[:, ::-1]
+    Y_anti, _ = lfilter(
+        b_anti, a, Ys_rev, axis=1, zi=lfilter_zi(b_anti, a) * Ys_rev[:, :1]
+    )
+    return Y_causal + Y_anti[:, ::-1]
+
+
+def _deriche_d2_coefs(sigma):
+    """Coefficients of recursive filters for the second derivative of Gaussian.
+
+    Returns numerators of the causal and the anti-causal filters, and the common
+    denominator, in the form accepted by :func:`scipy.signal.lfilter`.
+    """
+    dens = []
+    for w, l in _DERICHE_POLES:
+        w, r = w / sigma, np.exp(l / sigma)
+        dens.append(np.array([1, -2 * r * np.cos(w), r**2]))
+    a = np.convolve(*dens)
+
+    # Impulse response is sampled until it vanishes, to compute its moments.
+    n = np.arange(int(np.ceil(30 * sigma)) + 10)
+
+    def causal(coefs):
+        b, h = np.zeros(len(a)), np.zeros(len(n))
+        for (c, s), (w, l), den in zip(coefs, _DERICHE_POLES, dens[::-1]):
+            w, r = w / sigma, np.exp(l / sigma)
+            num = np.array([c, r * (s * np.sin(w) - c * np.cos(w))])
+            b[:-1] += np.convolve(num, den)
+            h += (c * np.cos(w * n) + s * np.sin(w * n)) * r**n
+        return b, h
+
+    b_d2, h_d2 = causal(_DERICHE_D2)
+    b_gauss, h_gauss = causal(_DERICHE_GAUSS)
+    # Mix with the Gaussian to have exact moments of the symmetric kernel:
+    # zero sum, and second moment of 2 so that quadratic signals are exact.
+    moments = [[2 * np.sum(h) - h[0] for h in (h_d2, h_gauss)]]
+    moments.append([2 * np.sum(n**2 * h) for h in (h_d2, h_gauss)])
+    alpha, beta = np.linalg.solve(moments, [0, 2])
+    b_causal = alpha * b_d2 + beta * b_gauss
+    # Anti-causal part excludes the center tap.
+    b_anti = b_causal - (alpha * h_d2[0] + beta * h_gauss[0]) * a
+    return b_causal, b_anti, a
+
+
+def _suffix_sum(a):
+    return np.cumsum(a[..., ::-1], axis=-1)[..., ::-1]
+
+
+def _tail_x_sums(M):
+    """Terms of :func:`_tail_std` which depend only on the profile length."""
+    # Centering does not change the residuals but reduces round-off errors.
+    x = np.arange(M) - (M - 1) / 2
+    n = np.arange(M, 0, -1)
+    Sx = _suffix_sum(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Sxx = _suffix_sum(x**2) - Sx**2 / n
+    return x, n, Sx, Sxx
+
+
+def _tail_std(Ys, x_sums=None, work=None):
+    """Residual standard deviation of linear regression on every tail of profiles.
+
+    Returns (N, M) array whose element (i, p) is the residual standard deviation of
+    linear regression on ``Ys[i, p:]``. Tails with less than three points give inf.
+    *x_sums* is the result of :func:`_tail_x_sums`, computed if not passed. *work* is
+    (6, N, M) float64 buffer for the intermediate sums, allocated if not passed.
+    The result is a view of *work*.
+    """
+    N, M = Ys.shape
+    if x_sums is None:
+        x_sums = _tail_x_sums(M)
+    if work is None:
+        work = np.empty((6, N, M))
+    x, n, Sx, Sxx = x_sums
+    y, Sy_rev, tmp, S_rev, Sxy, Syy = work
+    # Sums are accumulated in float64 regardless of the profile data type.
+    np.subtract(Ys, np.mean(Ys, axis=1, keepdims=True, dtype=np.float64), out=y)
+
+    # Suffix sums are cumulative sums of the reversed rows, viewed reversed back.
+    Sy = np.cumsum(y[:, ::-1], axis=1, out=Sy_rev)[:, ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.multiply(x, y, out=tmp)
+        S = np.cumsum(tmp[:, ::-1], axis=1, out=S_rev)[:, ::-1]
+        np.multiply(Sx, Sy, out=tmp)
+        np.divide(tmp, n, out=tmp)
+        np.subtract(S, tmp, out=Sxy)
+        np.square(y, out=tmp)
+        S = np.cumsum(tmp[:, ::-1], axis=1, out=S_rev)[:, ::-1]
+        np.square(Sy, out=tmp)
+        np.divide(tmp, n, out=tmp)
+        np.subtract(S, tmp, out=Syy)
+        # Residual sum of squares, and the standard deviation.
+        std = tmp
+        np.square(Sxy, out=std)
+        np.divide(std, Sxx, out=std)
+        np.subtract(Syy, std, out=std)
+        np.maximum(std, 0, out=std)
+        np.divide(std, n - 2, out=std)
+        np.sqrt(std, out=std)
+    std[:, n <= 2] = np.inf
+    return std
+
+
+def _find_peaks(x):
+    """Find local maxima of each row, equivalent to :func:`scipy.signal.find_peaks`.
+
+    Returns row indices and column indices of the peaks, sorted. The midpoint is
+    returned for a flat peak.
+    """
+    N, M = x.shape
+    if M < 3:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    # Last index of the run of equal values each sample belongs to.
+    changed = x[:, :-1] != x[:, 1:]
+    run_end = np.where(changed, np.arange(M - 1), M - 1)
+    run_end = np.minimum.accumulate(run_end[:, ::-1], axis=1)[:, ::-1]
+
+    # Peak starts where the signal rises, and ends where it falls.
+    rows, left = np.nonzero(x[:, :-2] < x[:, 1:-1])
+    left += 1
+    right = run_end[rows, left]
+    is_peak = right < M - 1
+    rows, left, right = rows[is_peak], left[is_peak], right[is_peak]
+    is_peak = x[rows, right + 1] < x[rows, left]
+    rows, left, right = rows[is_peak], left[is_peak], right[is_peak]
+    return rows, (left + right) // 2
+
+
+def decimate(Ys, Ls, factor):
+    """Decimate profiles with Gaussian anti-aliasing filter.
+
+    Parameters
+    ----------
+    Ys : (N, M) array
+        Array of N profiles.
+    Ls : (N,) array
+        Length of each profile.
+    factor : int
+        Decimation factor. Every *factor*-th point is kept, starting from the first.
+
+    Returns
+    -------
+    Ys : (N, ceil(M / factor)) array
+        Decimated profiles.
+    Ls : (N,) array
+        Number of kept points within each length.
+
+    Notes
+    -----
+    Profiles are smoothed by Gaussian filter with standard deviation of
+    ``(factor - 1) / 2`` points before sampling. Spatial resolution of the decimated
+    profiles is the original resolution divided by *factor*.
+
+    Examples
+    --------
+    >>> from heavyedge import get_sample_path, ProfileData
+    >>> from heavyedge.profile import decimate
+    >>> with ProfileData(get_sample_path("Prep-Type2.h5")) as data:
+    ...     Ys, Ls, _ = data[:]
+    >>> Ys_dec, Ls_dec = decimate(Ys, Ls, 4)
+    >>> Ys.shape[1], Ys_dec.shape[1]
+    (3200, 800)
+    """
+    if factor < 1:
+        raise ValueError(f"Decimation factor must be positive: {factor}")
+    Ys = np.asarray(Ys)
+    if factor > 1 and Ys.shape[1] > 0:
+        Ys = gaussian_filter1d(Ys, (factor - 1) / 2, axis=1, mode="nearest")
+    return Ys[:, ::factor].copy(), (np.asarray(Ls) - 1) // factor + 1
 
 
 def fill_after(Ys, Ls, fill_value):
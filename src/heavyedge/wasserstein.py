@@ -72,7 +72,8 @@ def quantile(x, fs, Ls, t):
     >>> t = np.linspace(0, 1, 100)
     >>> Qs = quantile(x, fs, Ls, t)
     """
-    Gs = cumulative_trapezoid(fs, x, initial=0, axis=-1)
+    # Distribution functions are integrated in float64 for any data type of *fs*.
+    Gs = cumulative_trapezoid(np.asarray(fs, dtype=np.float64), x, initial=0, axis=-1)
     return _quantile(x, Gs, Ls.astype(np.int32), t)
 
 
@@ -1,10 +1,12 @@
 import os
+import shutil
 import subprocess
 
 import numpy as np
 import pytest
 
-from heavyedge import ProfileData
+from heavyedge import ProfileData, RawProfileCsvs, get_sample_path
+from heavyedge.api import prep
 
 
 def test_process_commands(tmp_rawdata_type2_path, tmp_path):
@@ -79,6 +81,388 @@ def test_process_commands(tmp_rawdata_type2_path, tmp_path):
     assert os.path.exists(filled_path)
 
 
+def test_prep_readahead(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--res=1",
+            "--sigma=1",
+            "--std-thres=40",
+            "--fill-value=0",
+            "--z-thres=3.5",
+            "--batch-size=2",
+            "--readers=2",
+            "--prefetch=3",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
+def test_prep_workers(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--res=1",
+            "--sigma=1",
+            "--std-thres=40",
+            "--fill-value=0",
+            "--z-thres=3.5",
+            "--batch-size=3",
+            "--workers=2",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
+def test_prep_sweep(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "sweep.csv"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--sigmas",
+            "1",
+            "2",
+            "--std-thres=40",
+            "--sweep",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    table = np.loadtxt(path, delimiter=",", skiprows=1, dtype=str)
+    assert set(table[:, 1].astype(float)) == {1, 2}
+    lengths = {n: int(L) for n, s, _, L in table if float(s) == 1}
+    with ProfileData(tmp_prepdata_type2_path) as f:
+        _, Ls, names = f[:]
+    assert all(lengths[n] == L for n, L in zip(names, Ls))
+
+
+def test_prep_config_override(
+    tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path
+):
+    path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--config",
+            get_sample_path("config-prep.yml"),
+            "--sigma=1",
+            "--std-thres=40",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+    config_path = tmp_path / "config.yml"
+    config_path.write_text("sigmas: [8, 16]\nstd-thresholds: [40]\n")
+    sweep_path = tmp_path / "sweep.csv"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--config",
+            config_path,
+            "--sigmas",
+            "1",
+            "2",
+            "--sweep",
+            tmp_rawdata_type2_path,
+            "-o",
+            sweep_path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    table = np.loadtxt(sweep_path, delimiter=",", skiprows=1, dtype=str)
+    assert set(table[:, 1].astype(float)) == {1, 2}
+
+
+def test_float32(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    prep_path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--res=1",
+            "--sigma=1",
+            "--std-thres=40",
+            "--fill-value=0",
+            "--z-thres=3.5",
+            "--dtype=float32",
+            tmp_rawdata_type2_path,
+            "-o",
+            prep_path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(prep_path) as f2:
+        assert f2.dtype() == np.float32
+        (Ys1, Ls1, names1), (Ys2, Ls2, names2) = f1[:], f2[:]
+        assert np.array_equal(Ls1, Ls2) and np.array_equal(names1, names2)
+        assert np.allclose(Ys1, Ys2, rtol=1e-5, atol=1e-5)
+
+    scale_path = tmp_path / "Scaled.h5"
+    subprocess.run(
+        ["heavyedge", "scale", prep_path, "-o", scale_path],
+        capture_output=True,
+        check=True,
+    )
+    mean_path = tmp_path / "Mean.h5"
+    subprocess.run(
+        ["heavyedge", "mean", scale_path, "--wnum=100", "-o", mean_path],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(scale_path) as f1, ProfileData(mean_path) as f2:
+        assert f1.dtype() == np.float32
+        assert f2.dtype() == np.float32
+
+
+def test_prep_decimate(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--res=1",
+            "--sigma=1",
+            "--std-thres=40",
+            "--fill-value=0",
+            "--z-thres=3.5",
+            "--decimate=4",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        (N, M), (N_dec, M_dec) = f1.shape(), f2.shape()
+        assert N_dec == N and M_dec == -(-M // 4)
+        assert f2.resolution() == f1.resolution() / 4
+        (_, Ls, names), (_, Ls_dec, names_dec) = f1[:], f2[:]
+        assert np.array_equal(names, names_dec)
+        assert np.array_equal(Ls_dec, (Ls - 1) // 4 + 1)
+
+
+def test_prep_ragged(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "Type2.h5"
+    subprocess.run(
+        [
+            "heavyedge",
+            "prep",
+            "--type",
+            "csvs",
+            "--res=1",
+            "--sigma=1",
+            "--std-thres=40",
+            "--fill-value=0",
+            "--z-thres=3.5",
+            "--ragged",
+            tmp_rawdata_type2_path,
+            "-o",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert f2.is_ragged()
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
+def test_prep_cache(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    prep_args = [
+        "heavyedge",
+        "prep",
+        "--res=1",
+        "--sigma=1",
+        "--std-thres=40",
+        "--fill-value=0",
+        "--z-thres=3.5",
+        "--cache",
+    ]
+    path = tmp_path / "Type2.h5"
+    result = subprocess.run(
+        prep_args + ["--type=npy", tmp_rawdata_type2_path, "-o", path],
+        capture_output=True,
+    )
+    assert result.returncode != 0 and b"--cache" in result.stderr
+    rawdir = tmp_path / "raw"
+    shutil.copytree(tmp_rawdata_type2_path, rawdir)
+    for _ in range(2):
+        subprocess.run(
+            prep_args + ["--type=csvs", rawdir, "-o", path],
+            capture_output=True,
+            check=True,
+        )
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
+def test_prep_manifest(tmp_rawdata_type2_path, tmp_prepdata_type2_path, tmp_path):
+    prep_args = [
+        "heavyedge",
+        "prep",
+        "--res=1",
+        "--sigma=1",
+        "--std-thres=40",
+        "--fill-value=0",
+        "--z-thres=3.5",
+        "--manifest",
+    ]
+    path = tmp_path / "Type2.h5"
+    result = subprocess.run(
+        prep_args + ["--type=npy", tmp_rawdata_type2_path, "-o", path],
+        capture_output=True,
+    )
+    assert result.returncode != 0 and b"--manifest" in result.stderr
+    rawdir = tmp_path / "raw"
+    shutil.copytree(tmp_rawdata_type2_path, rawdir)
+    for _ in range(2):
+        subprocess.run(
+            prep_args + ["--type=csvs", rawdir, "-o", path],
+            capture_output=True,
+            check=True,
+        )
+    assert (rawdir / ".heavyedge-manifest.json").exists()
+    with ProfileData(tmp_prepdata_type2_path) as f1, ProfileData(path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
+def test_prep_append(tmp_rawdata_type3_path, tmp_path):
+    rawdir = tmp_path / "raw"
+    rawdir.mkdir()
+    files = sorted(tmp_rawdata_type3_path.glob("*.csv"))
+    prep_args = [
+        "heavyedge",
+        "prep",
+        "--type",
+        "csvs",
+        "--res=1",
+        "--sigma=1",
+        "--std-thres=40",
+        "--append",
+    ]
+
+    path = tmp_path / "Type3.h5"
+    for file in files[:3]:
+        shutil.copy(file, rawdir)
+    subprocess.run(prep_args + [rawdir, "-o", path], capture_output=True, check=True)
+    for file in files[3:]:
+        shutil.copy(file, rawdir)
+    subprocess.run(prep_args + [rawdir, "-o", path], capture_output=True, check=True)
+    subprocess.run(prep_args + [rawdir, "-o", path], capture_output=True, check=True)
+
+    full_path = tmp_path / "Type3-full.h5"
+    subprocess.run(
+        prep_args + [tmp_rawdata_type3_path, "-o", full_path],
+        capture_output=True,
+        check=True,
+    )
+    with ProfileData(path) as f1, ProfileData(full_path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+    contiguous_path = tmp_path / "Type3-contiguous.h5"
+    result = subprocess.run(
+        prep_args + ["--contiguous", rawdir, "-o", contiguous_path],
+        capture_output=True,
+    )
+    assert result.returncode != 0 and b"--contiguous" in result.stderr
+    assert not contiguous_path.exists()
+    subprocess.run(
+        prep_args[:-1] + ["--contiguous", rawdir, "-o", contiguous_path],
+        capture_output=True,
+        check=True,
+    )
+    result = subprocess.run(
+        prep_args + [rawdir, "-o", contiguous_path], capture_output=True
+    )
+    assert result.returncode != 0 and b"contiguous" in result.stderr
+
+
+def test_prep_append_outlier(tmp_rawdata_type3_path, tmp_path):
+    rawdir = tmp_path / "raw"
+    rawdir.mkdir()
+    files = sorted(tmp_rawdata_type3_path.glob("*.csv"))
+    prep_args = [
+        "heavyedge",
+        "prep",
+        "--type",
+        "csvs",
+        "--res=1",
+        "--sigma=32",
+        "--std-thres=0.01",
+        "--z-thres=2",
+        "--decimate=4",
+        "--append",
+        rawdir,
+        "-o",
+        tmp_path / "Type3.h5",
+    ]
+    for file in files[:20]:
+        shutil.copy(file, rawdir)
+    (rawdir / "empty.csv").touch()
+    subprocess.run(prep_args, capture_output=True, check=True)
+    for file in files[20:]:
+        shutil.copy(file, rawdir)
+    subprocess.run(prep_args, capture_output=True, check=True)
+    subprocess.run(prep_args, capture_output=True, check=True)
+
+    raw = RawProfileCsvs(rawdir)
+    areas = np.concatenate([a for *_, a in prep(raw, 32, 0.01, return_areas=True)])
+    names = np.concatenate([n for _, _, n in prep(raw, 32, 0.01)])
+    with ProfileData(tmp_path / "Type3.h5") as f:
+        stored = f[:][2]
+        area = f._file["area"][:]
+        rejected = np.char.decode(f._file["rejected"][:].astype("S"))
+    assert len(area) == len(stored)
+    assert np.array_equal(area, areas[np.searchsorted(names, stored)])
+    assert "empty" in rejected
+    assert np.array_equal(np.union1d(stored, rejected), raw.names())
+
+
 def test_mean_command(tmp_prepdata_type2_path, tmp_path):
     mean_path = tmp_path / "MeanProfile.h5"
     subprocess.run(
@@ -157,6 +541,22 @@ def test_edge_command(tmp_prepdata_type2_path, tmp_path):
     assert os.path.exists(padded_path)
 
 
+def test_edge_prefetch(tmp_prepdata_type2_path, tmp_path):
+    path = tmp_path / "AreaScaledProfiles.h5"
+    prefetch_path = tmp_path / "AreaScaledProfiles-prefetch.h5"
+    for out, options in [
+        (path, []),
+        (prefetch_path, ["--batch-size=2", "--prefetch=2"]),
+    ]:
+        subprocess.run(
+            ["heavyedge", "scale", tmp_prepdata_type2_path, *options, "-o", out],
+            capture_output=True,
+            check=True,
+        )
+    with ProfileData(path) as f1, ProfileData(prefetch_path) as f2:
+        assert all(np.all(d1 == d2) for d1, d2 in zip(f1[:], f2[:]))
+
+
 def test_filter_command(tmp_prepdata_type2_path, tmp_path):
     sorted_idx = [1, 2, 3]
     sorted_idx_path = tmp_path / "sorted.npy"
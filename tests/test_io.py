@@ -0,0 +1,319 @@
+import io
+import subprocess
+import sys
+import tarfile
+import time
+import zipfile
+
+import h5py
+import numpy as np
+import pytest
+
+from heavyedge import ProfileData, RawProfileCsvs, get_sample_path
+from heavyedge.api import mean_euclidean
+from heavyedge.io import (
+    RawProfileArchive,
+    RawProfileHdf5,
+    RawProfileNpy,
+    RawProfileWideCsv,
+)
+
+
+def test_rawprofilecsvs_parser(tmp_path):
+    rawdir = tmp_path / "raw"
+    rawdir.mkdir()
+    with open(rawdir / "00.csv", "w", newline="") as f:
+        f.write('1.5,a\r\n"2.0",b\r\n-3e-1\r\n')
+    (rawdir / "01.csv").touch()
+
+    raw = RawProfileCsvs(rawdir)
+    assert len(raw) == 2
+    Y, name = raw[0]
+    assert np.array_equal(Y, [1.5, 2.0, -0.3])
+    assert name == "00"
+    Y, name = raw[1]
+    assert Y.shape == (0,)
+    assert name == "01"
+
+    Ys, names = raw[:]
+    assert Ys.shape == (2, 3)
+    assert np.array_equal(Ys[0], [1.5, 2.0, -0.3])
+    assert np.all(np.isnan(Ys[1]))
+    assert list(names) == ["00", "01"]
+    Ys, names = raw[[1]]
+    assert Ys.shape == (1, 0)
+    assert list(names) == ["01"]
+
+
+def test_rawprofilecsvs_cache(tmp_rawdata_type3_path, tmp_path):
+    cache_path = tmp_path / "cache.npy"
+    raw = RawProfileCsvs(tmp_rawdata_type3_path)
+    Ys, names = raw[:]
+
+    cold = RawProfileCsvs(tmp_rawdata_type3_path, cache=cache_path)
+    assert cache_path.exists()
+    assert cache_path.with_suffix(".json").exists()
+    warm = RawProfileCsvs(tmp_rawdata_type3_path, cache=cache_path)
+    assert isinstance(warm._cache, np.memmap)
+    for data in [cold, warm]:
+        Ys_cache, names_cache = data[:]
+        assert np.array_equal(Ys, Ys_cache)
+        assert np.array_equal(names, names_cache)
+        assert np.array_equal(raw[3][0], data[3][0])
+        assert np.array_equal(Ys[[1, 3]], data[[1, 3]][0])
+
+
+def test_rawprofile_binary(tmp_rawdata_type3_path, tmp_path):
+    Ys, names = RawProfileCsvs(tmp_rawdata_type3_path)[:]
+    np.save(tmp_path / "raw.npy", Ys)
+    np.savez(tmp_path / "raw.npz", profiles=Ys, names=names)
+    with h5py.File(tmp_path / "raw.h5", "w") as f:
+        f.create_dataset("profiles", data=Ys)
+        f.create_dataset("names", data=names.astype(object), dtype=h5py.string_dtype())
+
+    idxs = [3, 0, 3]
+    for raw in [
+        RawProfileNpy(tmp_path / "raw.npy"),
+        RawProfileNpy(tmp_path / "raw.npz"),
+        RawProfileHdf5(tmp_path / "raw.h5"),
+    ]:
+        assert len(raw) == len(Ys)
+        assert np.array_equal(raw[1][0], Ys[1])
+        assert np.array_equal(raw[1:3][0], Ys[1:3])
+        assert np.array_equal(raw[idxs][0], Ys[idxs])
+        if isinstance(raw, RawProfileNpy) and raw.path.suffix == ".npy":
+            assert raw[-1][1] == str(len(Ys) - 1)
+            assert list(raw[idxs][1]) == ["3", "0", "3"]
+        else:
+            assert raw[-1][1] == names[-1]
+            assert np.array_equal(raw[idxs][1], names[idxs])
+
+
+def test_rawprofile_widecsv(tmp_rawdata_type3_path, tmp_path):
+    Ys, names = RawProfileCsvs(tmp_rawdata_type3_path)[:]
+    path = tmp_path / "raw.csv"
+    np.savetxt(path, Ys.T, delimiter=",", header=",".join(names), comments="")
+
+    raw = RawProfileWideCsv(path)
+    assert len(raw) == len(Ys)
+    assert np.allclose(raw[:][0], Ys)
+    assert np.array_equal(raw[:][1], names)
+    assert np.allclose(raw[2][0], Ys[2])
+    assert raw[2][1] == names[2]
+
+
+def test_rawprofile_archive(tmp_rawdata_type3_path, tmp_path):
+    Ys, names = RawProfileCsvs(tmp_rawdata_type3_path)[:]
+    files = sorted(tmp_rawdata_type3_path.glob("*.csv"), reverse=True)
+    with zipfile.ZipFile(tmp_path / "raw.zip", "w") as zf:
+        for file in files:
+            zf.write(file, f"raw/{file.name}")
+    with tarfile.open(tmp_path / "raw.tar.gz", "w:gz") as tf:
+        for file in files:
+            tf.add(file, file.name)
+
+    for path in [tmp_path / "raw.zip", tmp_path / "raw.tar.gz"]:
+        raw = RawProfileArchive(path)
+        assert len(raw) == len(Ys)
+        assert np.array_equal(raw[:][0], Ys)
+        assert np.array_equal(raw[:][1], names)
+        assert np.array_equal(raw[[3, 1]][0], Ys[[3, 1]])
+        assert np.array_equal(raw[2][0], Ys[2])
+        assert raw[2][1] == names[2]
+        raw.close()
+
+
+def test_rawprofile_archive_reversed(tmp_path):
+    # Reading members of compressed tar in reversed order must not decompress the
+    # archive again for every member.
+    N = 1000
+
+    def read_time(path, members):
+        with tarfile.open(path, "w:gz") as tf:
+            for i in members:
+                data = "\n".join(str(i + x) for x in range(300)).encode()
+                info = tarfile.TarInfo(f"{i:04d}.csv")
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        start = time.perf_counter()
+        raw = RawProfileArchive(path)
+        profiles = np.concatenate([raw[i : i + 10][0] for i in range(0, N, 10)])
+        raw.close()
+        assert np.array_equal(profiles[:, 0], np.arange(N))
+        return time.perf_counter() - start
+
+    sorted_time = read_time(tmp_path / "sorted.tar.gz", range(N))
+    reversed_time = read_time(tmp_path / "reversed.tar.gz", reversed(range(N)))
+    assert reversed_time < 3 * sorted_time
+
+
+def test_rawprofilecsvs_manifest(tmp_path):
+    rawdir = tmp_path / "raw"
+    rawdir.mkdir()
+    for i in range(3):
+        np.savetxt(rawdir / f"{i:02d}.csv", np.arange(5) + i)
+    manifest_path = tmp_path / "manifest.json"
+
+    raw = RawProfileCsvs(rawdir, manifest=manifest_path)
+    assert [p.name for p in raw.added] == ["00.csv", "01.csv", "02.csv"]
+    raw = RawProfileCsvs(rawdir, manifest=manifest_path)
+    assert len(raw) == 3
+    assert raw.added == []
+    np.savetxt(rawdir / "03.csv", np.arange(5))
+    raw = RawProfileCsvs(rawdir, manifest=manifest_path)
+    assert len(raw) == 4
+    assert [p.name for p in raw.added] == ["03.csv"]
+    assert raw[3][1] == "03"
+
+
+def test_profiledata_layout(tmp_path):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+    _, M = Ys.shape
+    for kwargs in [
+        dict(),
+        dict(chunks=4, compression="gzip", compression_opts=9, shuffle=True),
+        dict(chunks=(2, 100), compression="lzf"),
+    ]:
+        path = tmp_path / "profiles.h5"
+        with ProfileData(path, "w").create(M, res, **kwargs) as out:
+            for i in range(0, len(Ys), 8):
+                out.write_profiles(Ys[i : i + 8], Ls[i : i + 8], names[i : i + 8])
+        with ProfileData(path, rdcc_nbytes=2**22) as f:
+            dset = f._file["profiles"]
+            assert dset.compression == kwargs.get("compression")
+            if not kwargs:
+                assert dset.chunks == (32, M)
+            Ys_read, Ls_read, names_read = f[:]
+        assert np.array_equal(Ys_read, Ys)
+        assert np.array_equal(Ls_read, Ls)
+        assert np.array_equal(names_read, names)
+
+
+def test_profiledata_growth(tmp_path):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+    N, M = Ys.shape
+    path = tmp_path / "profiles.h5"
+    for capacity in [0, 3, 2 * N]:
+        with ProfileData(path, "w").create(M, res, capacity=capacity) as out:
+            for i in range(N):
+                out.write_profiles(Ys[i : i + 1], Ls[i : i + 1], names[i : i + 1])
+                assert len(out) == i + 1
+            assert out._file["profiles"].shape[0] >= N
+            assert np.array_equal(out[-1][0], Ys[-1])
+            assert np.array_equal(out[:][0], Ys)
+        with ProfileData(path) as f:
+            assert f._file["names"].shape == (N,)
+            Ys_read, Ls_read, names_read = f[:]
+        assert np.array_equal(Ys_read, Ys)
+        assert np.array_equal(Ls_read, Ls)
+        assert np.array_equal(names_read, names)
+    with ProfileData(path, "r+") as out:
+        out.write_profiles(Ys[:1], Ls[:1], names[:1])
+    with ProfileData(path) as f:
+        assert f.shape() == (N + 1, M)
+        assert f[-1][2] == names[0]
+
+
+def test_profiledata_interrupted(tmp_path):
+    # Writer exits without closing the file.
+    script = """
+import os, sys
+from heavyedge import ProfileData, get_sample_path
+with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+    Ys, Ls, names = f[:5]
+out = ProfileData(sys.argv[1], "w").create(
+    Ys.shape[1], 1.0, capacity=100, ragged=sys.argv[2] == "ragged"
+)
+out.write_profiles(Ys, Ls, names)
+os._exit(0)
+"""
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:6]
+    for layout in ["padded", "ragged"]:
+        path = tmp_path / f"{layout}.h5"
+        subprocess.run([sys.executable, "-c", script, path, layout], check=True)
+        with ProfileData(path) as f:
+            assert f.shape() == (5, Ys.shape[1])
+            Ys_read, Ls_read, names_read = f[:]
+        assert np.array_equal(Ls_read, Ls[:5])
+        assert np.array_equal(names_read, names[:5])
+        assert np.array_equal(Ys_read[:, : Ls[0]], Ys[:5, : Ls[0]])
+        with ProfileData(path, "r+") as out:
+            out.write_profiles(Ys[5:], Ls[5:], names[5:])
+        with ProfileData(path) as f:
+            assert f._file["names"].shape == (6,)
+            assert np.array_equal(f[:][2], names)
+
+
+def test_profiledata_ragged(tmp_path):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+    N, M = Ys.shape
+    path = tmp_path / "profiles.h5"
+    with ProfileData(path, "w").create(M, res, ragged=True, fill_value=np.nan) as out:
+        for i in range(0, N, 8):
+            out.write_profiles(Ys[i : i + 8], Ls[i : i + 8], names[i : i + 8])
+    with ProfileData(path) as f:
+        assert f.is_ragged()
+        assert f.shape() == (N, M)
+        assert f._file["values"].shape == (np.sum(Ls),)
+        for key in [slice(None), slice(3, 10), slice(None, None, 3), [1, 4, 9]]:
+            Ys_read, Ls_read, names_read = f[key]
+            mask = np.arange(M) < Ls_read[:, np.newaxis]
+            assert np.array_equal(Ys_read[mask], Ys[key][mask])
+            assert np.all(np.isnan(Ys_read[~mask]))
+            assert np.array_equal(Ls_read, Ls[key])
+            assert np.array_equal(names_read, names[key])
+        Y, L, name = f[-1]
+        assert np.array_equal(Y[:L], Ys[-1, :L]) and name == names[-1]
+        assert all(
+            np.array_equal(Y, Y_ref[:L]) for Y, Y_ref, L in zip(f.profiles(), Ys, Ls)
+        )
+
+
+def test_profiledata_memmap(tmp_path):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+        with pytest.raises(ValueError):
+            f.memmap()
+        mean = mean_euclidean(f, batch_size=8)
+    N, M = Ys.shape
+    path = tmp_path / "profiles.h5"
+    with ProfileData(path, "w").create(M, res, chunks=False, capacity=N + 1) as out:
+        out.write_profiles(Ys, Ls, names)
+    with ProfileData(path) as f:
+        assert f.shape() == (N, M)
+        assert np.array_equal(f.memmap(), Ys)
+        assert np.array_equal(f[:][0], Ys)
+        assert np.array_equal(mean_euclidean(f, batch_size=8), mean)
+    with ProfileData(path, "r+") as f:
+        f.write_profiles(Ys[:1], Ls[:1], names[:1])
+        with pytest.raises(ValueError):
+            f.write_profiles(Ys[:1], Ls[:1], names[:1])
+
+
+def test_profiledata_iter_batches(tmp_path):
+    with ProfileData(get_sample_path("Prep-Type3.h5")) as f:
+        Ys, Ls, names = f[:]
+        res = f.resolution()
+        for prefetch in [None, 1, 3]:
+            batches = list(f.iter_batches(8, prefetch))
+            assert [len(b[0]) for b in batches] == [8, 8, 8, 8, 3]
+            for data, ref in zip(zip(*batches), (Ys, Ls, names)):
+                assert np.array_equal(np.concatenate(data), ref)
+        ((Ys_all, _, _),) = f.iter_batches()
+        assert np.array_equal(Ys_all, Ys)
+    N, M = Ys.shape
+    path = tmp_path / "profiles.h5"
+    with ProfileData(path, "w").create(M, res, chunks=False, capacity=N) as out:
+        out.write_profiles(Ys, Ls, names)
+    with ProfileData(path) as f:
+        for prefetch in [None, 2]:
+            batches = f.iter_batches(8, prefetch, readonly=True)
+            assert np.array_equal(np.concatenate([b[0] for b in batches]), Ys)
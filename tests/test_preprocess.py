@@ -0,0 +1,165 @@
+import shutil
+
+import numpy as np
+
+from heavyedge import RawProfileCsvs, get_sample_path
+from heavyedge.api import prep
+from heavyedge.api.preprocess import _outlier, _RollingOutlier
+from heavyedge.io import RawProfileBase
+
+
+def test_rolling_outlier():
+    np.random.seed(0)
+    values = np.concatenate(
+        [np.random.standard_normal(50), np.random.randint(0, 4, 50).astype(float)]
+    )
+    values[[10, 30, 70]] = 10
+    for window in [1, 2, 7, 100]:
+        is_outlier = _RollingOutlier(window, 3.5)
+        for i, value in enumerate(values):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                expected = _outlier(values[max(i + 1 - window, 0) : i + 1])[-1]
+            assert is_outlier(value) == expected
+
+
+def test_prep_z_window():
+    raw = RawProfileCsvs(get_sample_path("Type3"))
+    Ys, _, names = next(prep(raw, 32, 0.01, fill_value=0))
+    sums = np.sum(Ys, axis=1)
+    window = 10
+    with np.errstate(divide="ignore", invalid="ignore"):
+        is_outlier = [
+            _outlier(sums[max(i + 1 - window, 0) : i + 1], 2)[-1]
+            for i in range(len(sums))
+        ]
+    gen = prep(raw, 32, 0.01, z_thres=2, batch_size=4, z_window=window)
+    names_online = np.concatenate([n for _, _, n in gen])
+    assert np.any(is_outlier)
+    assert np.array_equal(names_online, names[~np.array(is_outlier)])
+
+
+def test_prep_reference():
+    raw = RawProfileCsvs(get_sample_path("Type3"))
+    Ys, _, names = next(prep(raw, 32, 0.01, fill_value=0))
+    sums = np.sum(Ys, axis=1)
+    k, window = len(sums) - 5, 10
+    with np.errstate(divide="ignore", invalid="ignore"):
+        is_outlier = _outlier(sums, 2)[k:]
+        # Outlier is not detected among the new profiles only.
+        assert np.any(is_outlier) and not np.any(_outlier(sums[k:], 2))
+        is_outlier_online = np.array(
+            [_outlier(sums[i + 1 - window : i + 1], 2)[-1] for i in range(k, len(sums))]
+        )
+    kwargs = dict(z_thres=2, exclude=names[:k], reference=sums[:k])
+    names_new = np.concatenate([n for _, _, n in prep(raw, 32, 0.01, **kwargs)])
+    assert np.array_equal(names_new, names[k:][~is_outlier])
+    gen = prep(raw, 32, 0.01, z_window=window, **kwargs)
+    names_new = np.concatenate([n for _, _, n in gen])
+    assert np.array_equal(names_new, names[k:][~is_outlier_online])
+
+
+def test_prep_empty_batch(tmp_path):
+    rawdir = tmp_path / "Type3"
+    shutil.copytree(get_sample_path("Type3"), rawdir)
+    (rawdir / "00-empty.csv").touch()
+    Ys_ref, Ls_ref, names_ref = next(
+        prep(RawProfileCsvs(get_sample_path("Type3")), 32, 0.01)
+    )
+    for workers in [None, 2]:
+        gen = prep(RawProfileCsvs(rawdir), 32, 0.01, batch_size=1, workers=workers)
+        Ys, Ls, names = (np.concatenate(d) for d in zip(*gen))
+        assert np.array_equal(Ys, Ys_ref)
+        assert np.array_equal(Ls, Ls_ref)
+        assert np.array_equal(names, names_ref)
+
+
+class _CountingCsvs(RawProfileCsvs):
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = []
+
+    def __getitem__(self, key):
+        self.reads.extend(np.atleast_1d(np.arange(len(self))[key]))
+        return super().__getitem__(key)
+
+
+def test_prep_outlier_reads_once(tmp_path):
+    rawdir = tmp_path / "Type3"
+    shutil.copytree(get_sample_path("Type3"), rawdir)
+    (rawdir / "02-empty.csv").touch()
+    raw = _CountingCsvs(rawdir)
+    gen = prep(raw, 32, 0.01, z_thres=3.5, batch_size=1)
+    names = np.concatenate([n for _, _, n in gen])
+    assert sorted(raw.reads) == list(range(len(raw)))
+    assert len(names) > 0 and "02-empty" not in names
+
+    raw = _CountingCsvs(rawdir)
+    gen = prep(raw, 32, 0.01, z_thres=3.5, batch_size=4)
+    next(gen)
+    gen.close()
+    assert sorted(raw.reads) == list(range(len(raw)))
+
+
+class _IntegerOnlyRaw(RawProfileBase):
+    # Plugin which supports only integer indexing.
+    def __init__(self, path):
+        super().__init__(path)
+        self._raw = RawProfileCsvs(path)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __getitem__(self, key):
+        if not isinstance(key, int):
+            raise TypeError(f"Invalid index type: {type(key)}")
+        return self._raw[key]
+
+    def count_profiles(self):
+        return len(self)
+
+    def all_profiles(self):
+        return self._raw[:][0]
+
+    def profile_names(self):
+        yield from self._raw.names()
+
+
+def test_prep_integer_only_raw():
+    path = get_sample_path("Type3")
+    Ys_ref, Ls_ref, names_ref = next(prep(RawProfileCsvs(path), 32, 0.01))
+    raw = _IntegerOnlyRaw(path)
+    assert np.array_equal(raw.names(), names_ref)
+    gen = prep(raw, 32, 0.01, batch_size=4, exclude=names_ref[:2])
+    Ys, Ls, names = (np.concatenate(d) for d in zip(*gen))
+    assert np.array_equal(Ys, Ys_ref[2:])
+    assert np.array_equal(Ls, Ls_ref[2:])
+    assert np.array_equal(names, names_ref[2:])
+
+
+class _BulkRaw(_IntegerOnlyRaw):
+    # Plugin which implements bulk indexing, as documented.
+    def __init__(self, path):
+        super().__init__(path)
+        self.keys = []
+
+    def __getitem__(self, key):
+        self.keys.append(key)
+        return self._raw[key]
+
+
+def test_prep_bulk_raw():
+    path = get_sample_path("Type3")
+    raw = _BulkRaw(path)
+    Ys, _, _ = (np.concatenate(d) for d in zip(*prep(raw, 32, 0.01, batch_size=10)))
+    assert np.array_equal(Ys, next(prep(RawProfileCsvs(path), 32, 0.01))[0])
+    assert len(raw.keys) == 4
+    assert all(isinstance(key, slice) for key in raw.keys)
+
+
+def test_prep_spill_dir(tmp_path):
+    raw = RawProfileCsvs(get_sample_path("Type3"))
+    gen = prep(raw, 32, 0.01, z_thres=3.5, batch_size=4, spill_dir=tmp_path)
+    next(gen)
+    assert len(list(tmp_path.glob("*/spill.npy"))) == 1
+    gen.close()
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+from scipy.signal import find_peaks
+from scipy.stats import linregress
+
+from heavyedge import RawProfileCsvs, get_sample_path
+from heavyedge.api.profile import preprocess as preprocess_legacy
+from heavyedge.profile import (
+    Preprocessor,
+    _find_peaks,
+    _recursive_gaussian_d2,
+    _tail_std,
+    preprocess,
+    preprocess_sweep,
+)
+
+
+def test_find_peaks():
+    np.random.seed(0)
+    x = np.random.randint(0, 4, size=(50, 30)).astype(float)
+    rows, peaks = _find_peaks(x)
+    for i, row in enumerate(x):
+        assert np.array_equal(peaks[rows == i], find_peaks(row)[0])
+
+
+def test_tail_std():
+    np.random.seed(0)
+    Ys = np.cumsum(np.random.standard_normal((3, 40)), axis=1) + 100
+    std = _tail_std(Ys)
+    x = np.arange(Ys.shape[1])
+    for Y, std_row in zip(Ys, std):
+        for p in range(len(Y) - 2):
+            reg = linregress(x[p:], Y[p:])
+            res = Y[p:] - (reg.intercept + reg.slope * x[p:])
+            assert np.isclose(std_row[p], np.sqrt(np.sum(res**2) / (len(res) - 2)))
+        assert np.all(np.isinf(std_row[-2:]))
+
+
+def test_preprocess():
+    Ys = np.concatenate(
+        [RawProfileCsvs(get_sample_path(t))[:][0] for t in ["Type1", "Type3"]]
+    )
+    for sigma, std_thres in [(32, 0.01), (8, 0.1), (2, 0.05)]:
+        Ys_proc, Ls = preprocess(Ys, sigma, std_thres)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            for Y, Y_proc, L in zip(Ys, Ys_proc, Ls):
+                Y_ref, L_ref = preprocess_legacy(Y, sigma, std_thres)
+                assert L == L_ref
+                assert np.array_equal(Y_proc, Y_ref)
+
+
+def test_recursive_gaussian_d2():
+    x = np.arange(1001)
+    for sigma in [2, 8, 32]:
+        center = slice(8 * sigma, -8 * sigma)
+        # Second derivative of quadratic signal is recovered.
+        h_xx = _recursive_gaussian_d2(x[np.newaxis, :] ** 2 / 1e3, sigma)
+        assert np.allclose(h_xx[0, center], 2e-3, rtol=1e-2)
+        # Sinusoidal signal is attenuated by the Gaussian.
+        for w in [5e-3, 2e-2, 5e-2]:
+            h_xx = _recursive_gaussian_d2(np.sin(w * x)[np.newaxis, :], sigma)
+            expected = -(w**2) * np.exp(-((w * sigma) ** 2) / 2) * np.sin(w * x)
+            assert np.allclose(h_xx[0, center], expected[center], atol=1e-2 * w**2)
+
+
+def test_preprocess_iir():
+    Ys = np.concatenate(
+        [RawProfileCsvs(get_sample_path(t))[:][0] for t in ["Type1", "Type2", "Type3"]]
+    )
+    Ys = Ys[np.all(np.isfinite(Ys), axis=1)]
+    for sigma, std_thres in [(32, 0.01), (8, 0.1)]:
+        Ys_fir, Ls_fir = preprocess(Ys, sigma, std_thres)
+        Ys_iir, Ls_iir = preprocess(Ys, sigma, std_thres, filter="iir")
+        assert np.array_equal(Ls_iir, Ls_fir)
+        assert np.array_equal(Ys_iir, Ys_fir)
+
+
+def test_preprocess_coarse():
+    Ys = np.concatenate(
+        [RawProfileCsvs(get_sample_path(t))[:][0] for t in ["Type1", "Type2", "Type3"]]
+    )
+    Ys = Ys[np.all(np.isfinite(Ys), axis=1)]
+    Ys_full, Ls_full = preprocess(Ys, 32, 0.01)
+    for coarse in [1, 4, 8]:
+        Ys_coarse, Ls_coarse = preprocess(Ys, 32, 0.01, coarse=coarse)
+        assert np.array_equal(Ls_coarse, Ls_full)
+        assert np.array_equal(Ys_coarse, Ys_full)
+
+    np.random.seed(0)
+    for noise in [0, 0.001, 0.003]:
+        Ys_noisy = Ys + noise * np.random.standard_normal(Ys.shape)
+        for sigma, std_thres in [
+            (1, 0.01),
+            (2, 0.01),
+            (4, 0.001),
+            (8, 0.01),
+            (16, 0.1),
+        ]:
+            _, Ls_full = preprocess(Ys_noisy, sigma, std_thres)
+            for coarse in [2, 4, 8]:
+                _, Ls_coarse = preprocess(Ys_noisy, sigma, std_thres, coarse=coarse)
+                assert np.array_equal(Ls_coarse, Ls_full)
+
+
+def test_preprocess_sweep():
+    Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    sigmas, std_thresholds = [8, 32], [0.01, 0.1]
+    Ls = preprocess_sweep(Ys, sigmas, std_thresholds)
+    for i, sigma in enumerate(sigmas):
+        for j, std_thres in enumerate(std_thresholds):
+            assert np.array_equal(Ls[:, i, j], preprocess(Ys, sigma, std_thres)[1])
+
+
+def test_preprocessor():
+    Ys, _ = RawProfileCsvs(get_sample_path("Type3"))[:]
+    Ys = Ys[np.all(np.isfinite(Ys), axis=1)]
+    for filter in ["fir", "iir"]:
+        Ys_ref, Ls_ref = preprocess(Ys, 32, 0.01, filter)
+        preprocessor = Preprocessor(Ys.shape[1], 32, 0.01, filter)
+        for Y, Y_ref, L_ref in zip(Ys, Ys_ref, Ls_ref):
+            Y_proc, L = preprocessor(Y)
+            assert L == L_ref
+            assert np.array_equal(Y_proc, Y_ref)
+        Ys_proc, Ls = preprocessor(Ys)
+        assert np.array_equal(Ls, Ls_ref)
+        assert np.array_equal(Ys_proc, Ys_ref)